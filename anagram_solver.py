@@ -1,10 +1,13 @@
-from collections import deque
 from collections import OrderedDict
+import heapq
 from itertools import chain
-import pickle
+import time
 
-import simpletree
+import numpy as np
+
+import letterfilter
 import wordlist
+import wordtrie
 
 class AnagramSolver:
     '''
@@ -13,208 +16,774 @@ class AnagramSolver:
     provides a list of words built by tiles and sorted by score
         Provided tiles must have an attribute 'letters'
     '''
-    def __init__(self, min_letters = 1, max_letters = None):
-##        ### this code makes the pickle in the module path
-##        ### instead of caller path
-##        if '__file__' in globals(): #path to this source file
-##            this_dir = os.path.abspath(os.path.dirname(__file__))
-##        else: #relative path when running IDLE, etc.
-##            this_dir = ''
-##        pickle_path = os.path.join(this_dir, 'wordtree.pickle')
-        try: #try to load word tree from pickle to save lots of processing
-            f = open('wordtree.pickle', 'rb')
-            word_root = pickle.load(f)
-        except (IOError, EOFError, pickle.UnpicklingError):
-            print('Error loading word tree pickle. Creating a new one.')
-            # create new word tree if pickle not available
-            #filtering at the beginning by length reduces the size of the index
-            words = wordlist.WordList().filter_by(min_letters, max_letters)
-            word_root = self._parse_words_to_tree(words)
-            f = open('wordtree.pickle', 'wb')
-            pickle.dump(word_root, f, pickle.HIGHEST_PROTOCOL)
-        self._word_root = word_root
+    # above this many feasible words, searching the full index is cheaper
+    # than building a per-query trie
+    QUERY_TRIE_LIMIT = 20000
+    # slack for float rounding when comparing score bounds
+    POINTS_TOLERANCE = 1e-6
+
+    def __init__(self, min_letters = 1, max_letters = None, cache_size = 32,
+                 dictionaries = wordlist.DEFAULT_DICTIONARY,
+                 combine = 'union', exclude = (), registry = None):
+        '''
+        cache_size is the number of recent best_words results to remember
+            (0 to disable)
+        dictionaries, combine and exclude are the first dictionaries used
+            (see use_dictionaries)
+        registry is a wordlist.DictionaryRegistry that knows the dictionary
+            names (default: only wordlist.DEFAULT_DICTIONARY)
+        '''
+        # least recently used results. see _cache_key for what identifies one
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._registry = registry or wordlist.DictionaryRegistry()
+        self._min_letters = min_letters
+        self._max_letters = max_letters
+        # compiled words of each dictionary used so far
+        self._word_sources = {} #dictionary checksum: (trie, filter, info)
+        self.use_dictionaries(dictionaries, combine, exclude)
+
+    def use_dictionaries(self, dictionaries, combine = 'union', exclude = ()):
+        '''
+        Search the words of a combination of dictionaries from now on.
+        dictionaries is a name or names from the registry
+        combine is 'union' for words in any of them or 'intersection' for
+            words in all of them
+        exclude is a name or names of dictionaries whose words are never used
+        Each dictionary is compiled once and kept, and a combination is
+        searched through the compiled dictionaries it is made of, so
+        switching to any combination of them is a lookup. Compiled indexes
+        are also saved for the next start.
+        '''
+        names, combine, exclude = self._registry.selection(dictionaries,
+                                                           combine, exclude)
+        sources = []
+        for name in names + exclude:
+            checksum = self._registry.word_list(name).checksum()
+            source = self._word_sources.get(checksum)
+            if source is None:
+                source = self._load_word_source(name, checksum)
+                self._word_sources[checksum] = source
+            sources.append(source)
+        if len(names) == 1 and not exclude:
+            self._word_trie, self._letter_filter = sources[0][0:2]
+        else:
+            included, excluded = sources[:len(names)], sources[len(names):]
+            self._word_trie = wordtrie.CombinedTrie(
+                                  [source[0] for source in included], combine,
+                                  [source[0] for source in excluded])
+            self._letter_filter = letterfilter.CombinedFilter(
+                                      [source[1] for source in included],
+                                      combine,
+                                      [source[1] for source in excluded])
+        self._load_info = {
+            'seconds': sum(source[2]['seconds'] for source in sources),
+            'built index': any(source[2]['built index'] for source in sources)}
+        self._dictionaries = (names, combine, exclude)
+        self._source_checksum = self._registry.checksum(names, combine,
+                                                        exclude)
+
+    def dictionaries(self):
+        '''Return the (dictionaries, combine, exclude) being searched.'''
+        return self._dictionaries
+
+    def load_info(self):
+        '''
+        Return a dict of how long the current dictionaries took to load
+        (seconds) and whether an index had to be built (built index)
+        '''
+        return dict(self._load_info)
+
+    def _load_word_source(self, name, checksum):
+        started = time.perf_counter()
+        built = False
+        min_letters, max_letters = self._min_letters, self._max_letters
+        #filtering at the beginning by length reduces the size of the index
+        words = list(dict.fromkeys(self._registry.word_list(name).filter_by(
+                                       min_letters, max_letters)))
+        cache = self._registry.cache()
+
+        def load(index_path): #memory map to save lots of processing
+            return wordtrie.WordTrie.load(index_path, checksum,
+                                          min_letters, max_letters)
+
+        def build(index_path):
+            nonlocal built
+            print('Word index not found or stale. Creating a new one.')
+            #minimizing shares common endings (-s, -ed, -ing, ...) between words
+            word_trie = wordtrie.WordTrie.from_words(words, minimize = True)
+            if index_path:
+                word_trie.save(index_path, checksum, min_letters, max_letters)
+            built = True
+            return word_trie
+
+        word_trie = cache.load_or_build(
+                        cache.artifact_path('wordindex', checksum, min_letters,
+                                            max_letters,
+                                            wordtrie.FORMAT_VERSION,
+                                            wordlist.FORMAT_VERSION),
+                        load, build)
+        # letter count signatures discard impossible words before searching
+        letter_filter = letterfilter.LetterFilter(words)
+        info = {'seconds': time.perf_counter() - started,
+                'built index': built}
+        return word_trie, letter_filter, info
 
     def best_words(self, free_tiles, fixed_tiles = None, wrong_pos_tiles = None,
                    unique_words = True, list_limit = None, low_points = False,
-                   min_tiles = 1, max_tiles = None):
+                   min_tiles = 1, max_tiles = None, executor = None):
         '''
         tiles is a list of Tile objects (has letters, unique_key, points())
+        executor is an optional concurrent.futures.ProcessPoolExecutor. The
+            search is then split by first tile over its worker processes
         '''
-        tile_root = self._build_tile_tree(free_tiles, fixed_tiles,
-                                          wrong_pos_tiles, min_tiles, max_tiles)
-        all_words = self._find_tile_words(tile_root, min_tiles, max_tiles) #list of tile sequences
-        # sort list by total score for each tile sequence
-        sorted_words = sorted(all_words, key = lambda sequence: \
-                              sum([tile.points() for tile in sequence]),
-                              reverse = not low_points)
-        if unique_words:
-            sorted_words = self._unique_words(sorted_words)
-        if list_limit:
-            if list_limit >= 0:
-                sorted_words = sorted_words[0:list_limit]
-        return sorted_words
-
-    def _unique_words(self, words):
-        ' words must be a list of tile sequences(lists) '
-        ' maintains sorting '
-        ### replace this with a set filter
-        unique_words = OrderedDict()
-        for word in reversed(words):
-            string = ''
-            for tile in word:
-                string += tile.letters
-            unique_words[string] = word
-        return [unique_words[string] for string in reversed(unique_words)]
-
-    ### build tree may be doing too many things during construction.
-    ### simplify and process later?
-    def _build_tile_tree(self, free_tiles, fixed_tiles, wrong_pos_tiles,
-                         min_tiles, max_tiles):
-        q = deque()
-        tile_root = simpletree.TreeNode()
-        tile_root['tile'] = None
-        tile_root['is a word'] = False
-        tile_node = tile_root
-        letter_node = self._word_root
-        package = [letter_node, tile_node, free_tiles]
-        q.append(package) #initialize queue with both roots and all tiles
-        # continue processing qualifying nodes for longer words
-        while q:
-            letter_node, tile_node, free_tiles = q.pop()
-            duplicate_test = []
-            depth = tile_node.depth()
-            # if this depth should be a fixed tile, override available tiles
-            try: fixed_tile = fixed_tiles[depth]
-            except (IndexError, TypeError):  fixed_tile = None
-            if fixed_tile:
-                tiles = [fixed_tile]
-                fixed = True
+        query = dict(free_tiles = free_tiles, fixed_tiles = fixed_tiles,
+                     wrong_pos_tiles = wrong_pos_tiles,
+                     unique_words = unique_words, list_limit = list_limit,
+                     low_points = low_points,
+                     min_tiles = min_tiles, max_tiles = max_tiles)
+        key = self._cache_key(query)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache_hits += 1
+            self._cache.move_to_end(key)
+            words = self._from_cache(cached, query)
+        else:
+            self._cache_misses += 1
+            if executor is not None:
+                words = self._parallel_search(executor, query)
             else:
-                tiles = free_tiles
-                fixed = False
-            for tile in tiles:
-                #skip if duplicate tile
-                if tile in duplicate_test: continue
-                #skip if this is a disallowed position
-                try:
-                    if tile.letters in [wrong_tile.letters for wrong_tile in
-                                        wrong_pos_tiles[depth]]: continue
-                except (TypeError, IndexError): pass
-                #look for a match for this tile's letters in letter tree
-                new_letter_node = letter_node
-                for letter in tile.letters:
-                    try:
-                        new_letter_node = \
-                           list(new_letter_node.children_by_data('letter',
-                                                            letter.lower()))[0]
-                    except IndexError:
-                        new_letter_node = None
-                        break # stop when leaf letters reached
-                if new_letter_node == None: continue #continue to next tile
-                # add a new tile node
-                new_tile_node = simpletree.TreeNode()
-                new_tile_node['tile'] = tile
-                tile_node.graft(new_tile_node)
-                # mark as a word if it qualifies
-                mark_word = False
-                if new_letter_node['is a word']:
-                    mark_word = True
-                    if min_tiles:
-                        if depth + 1 < min_tiles:
-                            mark_word = False
-                    if max_tiles:
-                        if depth + 1 > max_tiles: mark_word = False
-                    word = self._node_to_word(new_tile_node)
-                    if wrong_pos_tiles:
-                        for wp_tile in chain.from_iterable(wrong_pos_tiles):
-                            if wp_tile:
-##                                #### this needs to count the tiles not just check in
-##                                #### e.g. one gold A and one silver A --> in passes
-##                                #### but actually 2 A's are necessary in the final word
-##                                #### but... a silver A that has later become
-##                                #### a gold A shouldn't be counted twice....?
-##                                #### arrgh. write out some examples to figure
-##                                #### what counts need to be compared
-##                                #### eliminate the number of silver letters
-##                                #### that have become gold letters later?
-##                                #### probably need to fix the incoming information
-##                                #### from bookworm AND fix here to counts
-##                                len([test_tile for test_tile in 
-                                if wp_tile.letters not in \
-                                   [word_tile.letters for word_tile in word]:
-                                    mark_word = False
-                new_tile_node['is a word'] = mark_word
-                #mark match in duplicate_test
-                duplicate_test.append(tile)
-                # make a new tile list
-                new_tiles = [new_tile for new_tile in free_tiles]
-                if not fixed: #remove current tile if working with free_tiles
-                    new_tiles.remove(tile)
-                # queue package if tiles remaining and under max_tiles
-                make_package = True
-                try: new_tiles[0] #at least 1 tile
-                except IndexError: make_package = False
-                try:
-                    if depth >= max_tiles:
-                        make_package = False
-                except TypeError: pass
-                if make_package:
-                    package = [new_letter_node, new_tile_node, new_tiles]
-                    q.append(package)
-        # trim any dead ends (could do during creation but gave me a headache)
-        for leaf in tile_root.leaves():
-            if leaf['is a word'] == True: continue
-            leaf.trim_dead_branch(stop_data_key = 'is a word',
-                                  stop_data_value = True)
-        return tile_root
-
-    def _find_tile_words(self, tile_root, min_tiles, max_tiles):
+                words = self._search(**query)
+            if self._cache_size > 0:
+                self._cache[key] = self._to_cache(words, query)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last = False)
+        return [list(word) for word, score in words]
+
+    def update_words(self, previous_words, free_tiles, changes,
+                     unique_words = True, list_limit = None, low_points = False,
+                     min_tiles = 1, max_tiles = None, executor = None):
+        '''
+        Same words as best_words for free_tiles, but only searches again for
+        the words that a change of a few tiles can affect.
+        previous_words is the best_words result from before the change with
+            the same options. A limited list (list_limit) that loses a word
+            can't be refilled, so that case is a (limited) best_words again
+        free_tiles is all the free tiles after the change
+        changes is (placed, pickedup) from FlexFrame.__sub__ of the new and
+            old boards (or two lists of tiles). placed tiles are new and
+            pickedup tiles are the ones they replaced
+        executor is as in best_words. It is used when the update falls back
+            to a full search. The search for changed words is small and
+            stays in this process
+        Words that are still valid are returned as they were, with the
+        previous (equal) tile objects, and come before new words with the
+        same score. Otherwise the list is the same as from best_words.
+        '''
+        query = dict(free_tiles = free_tiles, fixed_tiles = None,
+                     wrong_pos_tiles = None, unique_words = unique_words,
+                     list_limit = list_limit, low_points = low_points,
+                     min_tiles = min_tiles, max_tiles = max_tiles)
+        placed, pickedup = [[tile for tile, position in frame.nodes()]
+                            if hasattr(frame, 'nodes') else list(frame)
+                            for frame in changes]
+        # tiles that were on the board before and after the change
+        unchanged = {}
+        for tile in free_tiles:
+            tile_key = self._tile_key(tile)
+            unchanged[tile_key] = unchanged.get(tile_key, 0) + 1
+        placed_free = [tile for tile in placed
+                       if self._tile_key(tile) in unchanged]
+        for tile in placed_free:
+            tile_key = self._tile_key(tile)
+            if unchanged[tile_key]: unchanged[tile_key] -= 1
+        # previous words are still valid unless they need a picked up tile.
+        # this runs for every previous word so it only looks at each tile
+        # object once
+        pickedup_keys = set(self._tile_key(tile) for tile in pickedup)
+        tile_info = {} #id: (tile key, picked up)
+        kept = []
+        lost = set() #strings whose best tiles were picked up
+        for word in previous_words:
+            suspect = False
+            for tile in word:
+                try: tile_key, picked = tile_info[id(tile)]
+                except KeyError:
+                    tile_key = self._tile_key(tile)
+                    tile_key, picked = tile_info[id(tile)] = \
+                        (tile_key, tile_key in pickedup_keys)
+                suspect = suspect or picked
+            if suspect:
+                keys = [tile_info[id(tile)][0] for tile in word]
+                if any(keys.count(key) > unchanged.get(key, 0)
+                       for key in keys):
+                    lost.add(''.join(tile.letters for tile in word))
+                    continue
+            kept.append(word)
+        # a limited list can't be refilled and when most words are lost,
+        # searching them again costs as much as a full search
+        if lost and list_limit and list_limit >= 0 and \
+           len(previous_words) >= list_limit or \
+           len(lost) > len(previous_words) // 2:
+            return self.best_words(executor = executor, **query)
+        if not unique_words:
+            lost = set() #other tiles for a lost string are still in the list
+        # search only words that use a placed tile or respell a lost string
+        new_words = []
+        if placed_free or lost:
+            classes = _TileClasses(free_tiles)
+            limits = [unchanged.get(self._tile_key(tiles[0]), 0)
+                      for tiles in classes.tiles]
+
+            def keep(route, taken):
+                ' only words with a changed tile or a lost string '
+                return any(count > limit for count, limit in
+                           zip(taken, limits)) or \
+                       ''.join(tile.letters for tile in route) in lost
+
+            word_trie = self._changed_trie(free_tiles, unchanged, placed_free,
+                                           lost)
+            new_words = self._search(word_trie = word_trie, keep = keep,
+                                     **query)
+        scores = np.concatenate([self._score_words(kept),
+                                 [score for word, score in new_words]])
+        words = self._rank_words(kept + [word for word, score in new_words],
+                                 scores, low_points, unique_words, list_limit)
+        return [list(word) for word, score in words]
+
+    def _changed_trie(self, free_tiles, unchanged, placed_tiles, lost):
+        '''
+        Trie of the feasible words that may use one of the placed tiles:
+        words needing more of some letter than the unchanged tiles have,
+        plus words with a letter that a placed tile shares with some other
+        kind of tile (e.g. same letter with another status), where the
+        placed tile could replace that tile.
+        Lost words that the unchanged tiles can still spell are added too.
+            unchanged -- tile key: count of the unchanged free tiles
+        '''
+        available = ''.join(tile.letters for tile in free_tiles)
+        remaining = dict(unchanged)
+        unchanged_letters = []
+        for tile in free_tiles:
+            if remaining[self._tile_key(tile)]:
+                remaining[self._tile_key(tile)] -= 1
+                unchanged_letters.append(tile.letters)
+        shared = set()
+        for tile in placed_tiles:
+            if not tile.letters: #tiles without letters can be in any word
+                return self._query_trie(free_tiles, None, None)
+            if len(tile.letters) > 1:
+                shared.update(tile.letters.lower())
+            elif any(tile.letters.lower() in other.letters.lower() and
+                     other != tile for other in free_tiles):
+                shared.add(tile.letters.lower())
+        unchanged_letters = ''.join(unchanged_letters).lower()
+        #lost strings have the case of the tiles (e.g. upper case)
+        lost = [word for word in (word.lower() for word in lost) if
+                all(word.count(letter) <= unchanged_letters.count(letter)
+                    for letter in set(word))]
+        limit = self.QUERY_TRIE_LIMIT
+        words = self._letter_filter.feasible_words(available, limit = limit,
+                                not_within = unchanged_letters)
+        if words is not None and shared:
+            words += self._letter_filter.feasible_words(available,
+                                any_of = ''.join(shared), limit = limit)
+        if words is None or len(words) > limit:
+            return self._word_trie
+        return wordtrie.WordTrie.from_words(chain(words, lost))
+
+    def cache_info(self):
+        '''
+        Return a dict of hits, misses, size and max size of the result cache
+        '''
+        return {'hits': self._cache_hits, 'misses': self._cache_misses,
+                'size': len(self._cache), 'max size': self._cache_size}
+
+    def clear_cache(self):
+        self._cache.clear()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    def _cache_key(self, query):
+        '''
+        Canonical key of a query that doesn't depend on tile order.
+        Tiles are identified by a snapshot of their attributes and points
+        (tiles can change after the query, e.g. status in Link n Spell).
+        A hit for the same tiles in a different order gives the same words
+        and scores, but when two arrangements of a word tie, the one kept
+        is the one found first for the cached order.
+        '''
+        free_counts = {}
+        for tile in query['free_tiles']:
+            tile_key = self._tile_key(tile)
+            free_counts[tile_key] = free_counts.get(tile_key, 0) + 1
+        fixed = tuple(self._tile_key(tile) if tile else None
+                      for tile in (query['fixed_tiles'] or []))
+        wrong_pos = tuple(frozenset(tile.letters for tile in tiles if tile)
+                          for tiles in (query['wrong_pos_tiles'] or []))
+        list_limit = query['list_limit']
+        if not (list_limit and list_limit >= 0): list_limit = None
+        return (frozenset(free_counts.items()), fixed, wrong_pos,
+                query['unique_words'], list_limit, query['low_points'],
+                query['min_tiles'], query['max_tiles'], self._source_checksum)
+
+    def _tile_key(self, tile):
+        return (tile._key(), tile.points())
+
+    def _to_cache(self, words, query):
+        '''
+        Store words as tile keys (None for fixed positions) so they can be
+        rebuilt from the tiles of a later query with the same key.
+        '''
+        fixed_tiles = query['fixed_tiles'] or []
+        cached = []
+        for word, score in words:
+            tile_keys = tuple(None if depth < len(fixed_tiles) and
+                              fixed_tiles[depth] else self._tile_key(tile)
+                              for depth, tile in enumerate(word))
+            cached.append((tile_keys, score))
+        return cached
+
+    def _from_cache(self, cached, query):
+        '''
+        Rebuild cached words with this query's tile objects. Each use of a
+        kind of tile takes the next such tile in order, as the search does,
+        and words are re-sorted by score and then by the position of their
+        tiles (the search order), in case this query lists tiles differently.
+        '''
+        free_tiles = query['free_tiles']
+        fixed_tiles = query['fixed_tiles'] or []
+        members = {} #tile key: [(index, tile), ...] in order
+        for index, tile in enumerate(free_tiles):
+            members.setdefault(self._tile_key(tile), []).append((index, tile))
+        ranked = []
+        for tile_keys, score in cached:
+            used = {}
+            word = []
+            positions = []
+            for depth, tile_key in enumerate(tile_keys):
+                if tile_key is None:
+                    word.append(fixed_tiles[depth])
+                    positions.append(-1)
+                    continue
+                count = used.get(tile_key, 0)
+                used[tile_key] = count + 1
+                index, tile = members[tile_key][count]
+                word.append(tile)
+                positions.append(index)
+            sort_score = score if query['low_points'] else -score
+            ranked.append((sort_score, positions, tuple(word), score))
+        ranked.sort(key = lambda entry: entry[0:2])
+        return [(word, score) for sort_score, positions, word, score in ranked]
+
+    def _search(self, free_tiles, fixed_tiles, wrong_pos_tiles, unique_words,
+                list_limit, low_points, min_tiles, max_tiles,
+                first_class = None, word_trie = None, keep = None):
+        '''
+        Return the best (tiles, score) pairs in order. first_class limits the
+        search to words starting with that class of free tiles.
+        word_trie replaces the feasible words of the tiles and keep is as in
+        _iter_tile_words.
+        '''
+        if word_trie is None:
+            word_trie = self._query_trie(free_tiles, fixed_tiles,
+                                         wrong_pos_tiles, min_tiles)
+        classes = _TileClasses(free_tiles)
+        if list_limit and list_limit >= 0:
+            return self._bounded_words(word_trie, classes, fixed_tiles,
+                                       wrong_pos_tiles, unique_words,
+                                       list_limit, low_points,
+                                       min_tiles, max_tiles, first_class,
+                                       keep)
+        all_words = self._iter_tile_words(word_trie, classes, fixed_tiles,
+                                          wrong_pos_tiles, min_tiles, max_tiles,
+                                          first_class = first_class,
+                                          keep = keep)
         words = []
-        for word_node in tile_root.traverse():
-            word = self._node_to_word(word_node)
-            num_tiles = len(word)
-            add_word = True
-            if not word_node['is a word']:
-                add_word = False
-            try:
-                if num_tiles < min_tiles: add_word = False
-            except TypeError: pass
-            try:
-                if num_tiles > max_tiles: add_word = False
-            except TypeError: pass
-            if add_word: words.append(word)
-        return words
-
-    def _node_to_word(self, tile_node):
-        return [node['tile'] for node in tile_node.route_from_root() if
-                node['tile']] #exclude root
-
-    def _parse_words_to_tree(self, words):
-        ### shouldn't this be in word list? ###
-        '''
-        each letter node contains:
-            - letter (one character string)
-            - is a word (boolean)
-            - next_letters (dict)
-        '''
-        root = simpletree.TreeNode()
-        root['letter'] = None
-        root['is a word'] = False
+        scores = []
+        for word, score in all_words:
+            words.append(word)
+            scores.append(score)
+        return self._rank_words(words, scores, low_points, unique_words)
+
+    def _parallel_search(self, executor, query):
+        '''
+        Search each first tile class in a worker process and merge.
+        Every partition returns its own best list (top list_limit if given),
+        which always contains that partition's share of the overall best.
+        Partitions come back in search order, so a stable sort by score
+        gives the same order as a single search.
+        '''
+        free_tiles = query['free_tiles']
+        fixed_tiles = query['fixed_tiles'] or []
+        classes = _TileClasses(free_tiles)
+        if (fixed_tiles and fixed_tiles[0]) or len(classes.tiles) < 2:
+            return self._search(**query) #nothing to split
+        solver_args = (self._min_letters, self._max_letters,
+                       tuple(self._registry.paths().items()),
+                       self._registry.cache())
+        futures = [executor.submit(_search_partition, solver_args,
+                                   self._dictionaries, number, query)
+                   for number in range(len(classes.tiles))]
+        words = []
+        scores = []
+        for future in futures:
+            for indexes, score in future.result():
+                words.append(tuple(free_tiles[index] if index >= 0 else
+                                   fixed_tiles[depth]
+                                   for depth, index in enumerate(indexes)))
+                scores.append(score)
+        return self._rank_words(words, scores, query['low_points'],
+                                query['unique_words'], query['list_limit'])
+
+    def _score_words(self, words):
+        '''
+        Array of the scores of tile sequences. Each distinct tile's points
+        are looked up once into a points vector, words become rows of
+        indexes into it (padded with a zero points entry) and the rows are
+        summed one column at a time, left to right, so the sums round
+        exactly like the scores added up during the search.
+        '''
+        number_of = {} #id of tile: index into points
+        points = [0.0] #padding
+        width = max([len(word) for word in words] or [0])
+        indexes = []
         for word in words:
-            current = root #start spelling new word at root
-            for letter in word:
-                try: #found letter. move ahead
-                    current = \
-                        list(current.children_by_data('letter', letter))[0]
-                    continue
-                except IndexError: #didn't find letter. crate it.
-                    new = simpletree.TreeNode()
-                    new['letter'] = letter
-                    new['is a word'] = False
-                    current.graft(new)
-                    current = new
-            current['is a word'] = True
-        return root
+            for tile in word:
+                number = number_of.get(id(tile))
+                if number is None:
+                    number = number_of[id(tile)] = len(points)
+                    points.append(tile.points())
+                indexes.append(number)
+            indexes.extend([0] * (width - len(word)))
+        points = np.array(points, dtype = float)
+        indexes = np.array(indexes, dtype = np.intp).reshape(len(words), width)
+        scores = np.zeros(len(words))
+        for column in indexes.T:
+            scores += points[column]
+        return scores
+
+    def _rank_words(self, words, scores, low_points, unique_words,
+                    list_limit = None):
+        '''
+        Return (word, score) best first. Same as a stable sort by score,
+        keeping only the first (best) tiles of each string if unique_words,
+        then taking the first list_limit words.
+        Without unique_words, only the best list_limit words get sorted.
+        '''
+        scores = np.asarray(scores, dtype = float)
+        keys = scores if low_points else -scores
+        if not (list_limit and list_limit >= 0):
+            list_limit = None
+        if unique_words:
+            order = np.argsort(keys, kind = 'stable')
+            string_ids = {}
+            strings = np.array([string_ids.setdefault(
+                                    ''.join(tile.letters for tile in word),
+                                    len(string_ids)) for word in words],
+                               dtype = np.intp)
+            #first position of each string in sorted order
+            firsts = np.unique(strings[order], return_index = True)[1]
+            order = order[np.sort(firsts)]
+        elif list_limit is not None and list_limit < len(words):
+            # everything better than the list_limit-th key, then ties with
+            # it in their original order
+            kth = np.partition(keys, list_limit - 1)[list_limit - 1]
+            better = np.flatnonzero(keys < kth)
+            ties = np.flatnonzero(keys == kth)[0:list_limit - len(better)]
+            chosen = np.sort(np.concatenate([better, ties]))
+            order = chosen[np.argsort(keys[chosen], kind = 'stable')]
+        else:
+            order = np.argsort(keys, kind = 'stable')
+        if list_limit is not None:
+            order = order[0:list_limit]
+        return [(words[index], float(scores[index])) for index in order]
+
+    def _bounded_words(self, word_trie, classes, fixed_tiles,
+                       wrong_pos_tiles, unique_words, list_limit, low_points,
+                       min_tiles, max_tiles, first_class = None, keep = None):
+        '''
+        Branch and bound version of the full search + sort + slice.
+        Only the best list_limit words are kept in a heap. A branch is
+        skipped once even its optimistic score (current score plus the best
+        points still available to the remaining positions) cannot beat the
+        worst kept word. Words are found in the same pre-order as the full
+        search and ties keep the word found first, so the result is the
+        same as the stable sort of the full search.
+        '''
+        sign = -1 if low_points else 1 #signed points: larger is always better
+        fixed_points = [sign * tile.points() if tile else None
+                        for tile in (fixed_tiles or [])]
+        # tiles without letters can make words longer than the trie allows
+        empty_tiles = len([tile for tiles in classes.tiles for tile in tiles
+                           if not tile.letters])
+        #worst kept word on top: (signed score, -order, string, word, score)
+        heap = []
+        kept = {} #string: heap entry, only used for unique words
+
+        def prune(letter_node, depth, score, taken):
+            ''' skip branches that can't reach the worst kept word '''
+            if (len(kept) if unique_words else len(heap)) < list_limit:
+                return False
+            threshold = self._heap_worst(heap, kept, unique_words)[0]
+            positions = word_trie.height(letter_node) + empty_tiles
+            if max_tiles:
+                positions = min(positions, max_tiles - depth)
+            # best points for each position left: free tiles still untaken
+            # and fixed tiles still ahead
+            ahead = [(sign * points, len(tiles) - count) for points, tiles, count
+                     in zip(classes.points, classes.tiles, taken)]
+            ahead.extend((points, 1) for points in fixed_points[depth:]
+                         if points is not None)
+            ahead.sort(reverse = True)
+            bound = sign * score
+            for points, count in ahead:
+                if points <= 0 or positions <= 0: break
+                count = min(count, positions)
+                bound += points * count
+                positions -= count
+            return bound < threshold - self.POINTS_TOLERANCE
+
+        words = self._iter_tile_words(word_trie, classes, fixed_tiles,
+                                      wrong_pos_tiles, min_tiles, max_tiles,
+                                      prune = prune, first_class = first_class,
+                                      keep = keep)
+        for order, (word, score) in enumerate(words):
+            # keep the word if it makes the current top list
+            string = ''.join(tile.letters for tile in word)
+            entry = (sign * score, -order, string, word, score)
+            if not unique_words:
+                heapq.heappush(heap, entry)
+            elif string not in kept or kept[string][0] < entry[0]:
+                kept[string] = entry
+                heapq.heappush(heap, entry)
+            self._trim_heap(heap, kept, unique_words, list_limit)
+        best = sorted(heap, reverse = True)
+        if unique_words:
+            best = [entry for entry in best if kept.get(entry[2]) is entry]
+        return [(entry[3], entry[4]) for entry in best]
+
+    def _heap_worst(self, heap, kept, unique_words):
+        '''
+        Return the worst current entry, dropping replaced entries on the way
+        '''
+        if unique_words:
+            while kept.get(heap[0][2]) is not heap[0]:
+                heapq.heappop(heap)
+        return heap[0]
+
+    def _trim_heap(self, heap, kept, unique_words, list_limit):
+        if unique_words:
+            if len(kept) > list_limit:
+                worst = self._heap_worst(heap, kept, unique_words)
+                heapq.heappop(heap)
+                del kept[worst[2]]
+        elif len(heap) > list_limit:
+            heapq.heappop(heap)
+
+    def _query_trie(self, free_tiles, fixed_tiles, wrong_pos_tiles,
+                    min_tiles = 1):
+        '''
+        Small trie of only the words whose letters are a sub-multiset of
+        the letters on all tiles, so the search cost follows the number of
+        feasible words instead of the whole dictionary.
+        A fixed tile's letters are only required when min_tiles makes every
+        word reach its position (shorter words don't use it).
+        Falls back to the full index if too many words are feasible.
+        '''
+        reached_tiles = [tile for depth, tile in enumerate(fixed_tiles or [])
+                         if tile and depth < (min_tiles or 0)]
+        fixed_tiles = [tile for tile in (fixed_tiles or []) if tile]
+        wrong_pos_tiles = [tile for tile in
+                           chain.from_iterable(wrong_pos_tiles or []) if tile]
+        available = ''.join(tile.letters for tile in
+                            chain(free_tiles, fixed_tiles))
+        required = ''.join(tile.letters for tile in
+                           chain(reached_tiles, wrong_pos_tiles))
+        words = self._letter_filter.feasible_words(available, required,
+                                            limit = self.QUERY_TRIE_LIMIT)
+        if words is None:
+            return self._word_trie
+        return wordtrie.WordTrie.from_words(words)
+
+    def _iter_tile_words(self, word_trie, classes, fixed_tiles,
+                         wrong_pos_tiles, min_tiles, max_tiles, prune = None,
+                         first_class = None, keep = None):
+        '''
+        Generate (tiles, score) for every tile sequence that spells a word.
+        Depth-first over one shared route of tiles: each step only appends
+        to / pops from the route and takes / returns one tile of a class,
+        so nothing is allocated per explored prefix and memory is O(depth).
+        Each class of equal tiles is tried once per position no matter how
+        many copies there are. Sequences come out in pre-order of the tile
+        choices, the same order as trying the free tiles one by one.
+            classes -- _TileClasses of the free tiles
+            fixed_tiles -- tile forced at each position (None for free)
+            wrong_pos_tiles -- per position, tiles whose letters can't go
+                there but must appear somewhere in the word
+            prune -- optional prune(letter node, depth, score, taken counts)
+                returning True to skip everything below the current route
+            first_class -- only search words starting with this tile class
+            keep -- optional keep(route, taken counts) returning False to
+                leave out a word that otherwise qualifies
+        '''
+        fixed_tiles = fixed_tiles or []
+        wrong_pos_tiles = wrong_pos_tiles or []
+        wrong_letters = [[wrong_tile.letters for wrong_tile in tiles]
+                         for tiles in wrong_pos_tiles]
+        required_letters = [wp_tile.letters for wp_tile in
+                            chain.from_iterable(wrong_pos_tiles) if wp_tile]
+        taken = [0] * len(classes.tiles) #tiles used from each class
+        free_count = len(classes)
+        route = [] #tiles on the current route
+        route_classes = [] #class of each route tile (None if fixed)
+        # one iterator of qualifying next steps for each route depth
+        first_steps = self._next_steps(word_trie, word_trie.ROOT, 0, 0,
+                                       classes, taken, fixed_tiles,
+                                       wrong_letters)
+        if first_class is not None:
+            first_steps = [step for step in first_steps
+                           if step[1] == first_class]
+        steps = [iter(first_steps)]
+        while steps:
+            step = next(steps[-1], None)
+            if step is None: #all choices at this depth done. back up
+                steps.pop()
+                if route:
+                    route.pop()
+                    number = route_classes.pop()
+                    if number is not None:
+                        taken[number] -= 1
+                        free_count += 1
+                continue
+            tile, number, letter_node, score = step
+            route.append(tile)
+            route_classes.append(number)
+            if number is not None: #take the tile from free tiles
+                taken[number] += 1
+                free_count -= 1
+            depth = len(route)
+            # yield if it's a word that qualifies
+            if word_trie.is_word(letter_node) and \
+               (not min_tiles or depth >= min_tiles) and \
+               (not max_tiles or depth <= max_tiles):
+                letters = [route_tile.letters for route_tile in route]
+                if all(required in letters for required in required_letters) \
+                   and not (keep and not keep(route, taken)):
+                    yield tuple(route), score
+            # go deeper if tiles remaining, under max_tiles and not pruned
+            if free_count and not (max_tiles and depth >= max_tiles) and \
+               not (prune and prune(letter_node, depth, score, taken)):
+                steps.append(iter(self._next_steps(word_trie, letter_node,
+                                                   depth, score, classes,
+                                                   taken, fixed_tiles,
+                                                   wrong_letters)))
+            else: #leaf of the search. undo this step right away
+                route.pop()
+                route_classes.pop()
+                if number is not None:
+                    taken[number] -= 1
+                    free_count += 1
+
+    def _next_steps(self, word_trie, letter_node, depth, score, classes,
+                    taken, fixed_tiles, wrong_letters):
+        '''
+        List (tile, class, letter node, score) for each distinct tile
+        that can extend the route at depth
+        '''
+        # if this depth should be a fixed tile, override available tiles
+        try: fixed_tile = fixed_tiles[depth]
+        except IndexError: fixed_tile = None
+        if fixed_tile:
+            choices = [(fixed_tile, None, fixed_tile.points())]
+        else:
+            choices = classes.available(taken)
+        try: wrong_here = wrong_letters[depth]
+        except IndexError: wrong_here = ()
+        steps = []
+        for tile, number, points in choices:
+            #skip if this is a disallowed position
+            if tile.letters in wrong_here: continue
+            #look for a match for this tile's letters in letter index
+            new_letter_node = word_trie.walk(letter_node, tile.letters)
+            if not new_letter_node: continue
+            steps.append((tile, number, new_letter_node, score + points))
+        return steps
+
+
+class _TileClasses:
+    '''
+    Free tiles grouped into classes of equal tiles (same letters, status...)
+    so the search branches once per class instead of once per tile and
+    taking / returning a tile is a count change.
+        tiles -- per class, the equal tiles in the order they were given
+        indexes -- per class, the position of each of those tiles
+        points -- per class, the points of one tile
+    '''
+    def __init__(self, free_tiles):
+        numbers = {} #tile: class number
+        self.tiles = []
+        self.indexes = []
+        self.points = []
+        for index, tile in enumerate(free_tiles):
+            number = numbers.get(tile)
+            if number is None:
+                number = numbers[tile] = len(self.tiles)
+                self.tiles.append([])
+                self.indexes.append([])
+                self.points.append(tile.points())
+            self.tiles[number].append(tile)
+            self.indexes[number].append(index)
+        self._count = len(free_tiles)
+
+    def available(self, taken):
+        '''
+        List (tile, class, points) for each class with tiles left. The tile
+        is the first unused one of the class and classes are ordered by the
+        position of that tile, same as scanning the remaining free tiles.
+        '''
+        choices = [(self.indexes[number][count], number)
+                   for number, count in enumerate(taken)
+                   if count < len(self.tiles[number])]
+        choices.sort()
+        return [(self.tiles[number][taken[number]], number,
+                 self.points[number]) for index, number in choices]
+
+    def __len__(self):
+        return self._count
+
+
+_worker_solvers = {} #(min letters, max letters, paths, cache): solver
+
+def _search_partition(solver_args, selection, first_class, query):
+    '''
+    Worker process side of AnagramSolver._parallel_search.
+    Each worker opens the memory mapped index once and keeps the solver
+    (and every dictionary combination it was asked for).
+    Returns (free tile index or -1 for a fixed tile, ..., score) per word
+    since the tiles themselves are copies in the worker.
+    '''
+    solver = _worker_solvers.get(solver_args)
+    if solver is None:
+        min_letters, max_letters, paths, cache = solver_args
+        dictionaries, combine, exclude = selection
+        solver = AnagramSolver(min_letters, max_letters,
+                               dictionaries = dictionaries, combine = combine,
+                               exclude = exclude,
+                               registry = wordlist.DictionaryRegistry(
+                                              dict(paths), cache))
+        _worker_solvers[solver_args] = solver
+    elif solver.dictionaries() != selection:
+        solver.use_dictionaries(*selection)
+    positions = {}
+    for index, tile in enumerate(query['free_tiles']):
+        positions.setdefault(id(tile), index)
+    words = solver._search(first_class = first_class, **query)
+    return [(tuple(positions.get(id(tile), -1) for tile in word), score)
+            for word, score in words]
+
 
 def main():
     import tile
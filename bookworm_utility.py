@@ -1,14 +1,18 @@
 import os
 from collections import OrderedDict
-from time import sleep
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter, sleep
 from functools import partial
 
 import autoconfig
+import cachedir
 import image_to_data
+import screen_capture
 import anagram_solver
 import tile
 import flexframe
 import simpleui
+import wordlist
 
 class BookwormUtility:
     '''
@@ -17,6 +21,7 @@ class BookwormUtility:
         -Grabs game data through screenshots
     '''
     def __init__(self):
+        started = perf_counter()
         self._ac = autoconfig.AutoConfig.from_file('config.ini',
                                                   interpret_data = True)
         ''' create the image to data objects '''
@@ -24,23 +29,41 @@ class BookwormUtility:
         letters = self._get_letter_templates(path = template_path)
         ### can get rid of the scale_h junk when scale invariant implemented
         scale_h = self._ac.get('templates','letter parent height')
+        coarse_levels = self._ac.get('templates','coarse levels')
+        coarse_candidates = self._ac.get('templates','coarse candidates')
+        capture = self._get_capture()
         self._screen_to_letters = image_to_data.ImageToData(\
             templates_and_data = letters, method = 'grayscale correlation',
             crop_to_resolution = True, crop_to_4to3_aspect = True,
-            shrink_to_height = scale_h)
+            shrink_to_height = scale_h, coarse_levels = coarse_levels,
+            coarse_candidates = coarse_candidates, capture = capture)
 
         template_path = self._ac.get('templates','statuses path')
         statuses = self._get_status_templates(path = template_path)
         self._screen_to_status = image_to_data.ImageToData(\
             templates_and_data = statuses, method = 'rgb correlation',
             crop_to_resolution = True, crop_to_4to3_aspect = True,
-            shrink_to_height = scale_h)
+            shrink_to_height = scale_h, coarse_levels = coarse_levels,
+            coarse_candidates = coarse_candidates, capture = capture)
+        # both are read from one capture of the screen per tile grid
+        self._screen_to_tiles = image_to_data.MultiImageToData(
+            {'letters': self._screen_to_letters,
+             'status': self._screen_to_status})
 
-        ''' anagram solver takes time to load, so do it on startup '''
-        ### change to a function
-        self._anagram = anagram_solver.AnagramSolver(
-                          min_letters = self._ac.get('anagram','min letters'),
-                          max_letters = self._ac.get('anagram','max letters'))
+        ''' anagram solver takes time to load, so load it in the background '''
+        # queries wait for it in _solver() only if it is not ready yet
+        self._anagram = self._load_solver_in_background(started)
+        # one points table for every tile read from the screen
+        self._tile_scores = BookwormScores(
+            {option: self._ac.get('status multipliers', option)
+             for option in self._ac.options('status multipliers')},
+            {option: self._ac.get('letter points', option)
+             for option in self._ac.options('letter points')})
+        # optional worker processes to split large searches over cores
+        workers = self._ac.get('anagram','worker processes')
+        self._executor = ProcessPoolExecutor(workers) if workers else None
+        # last board, list limit and best words per grid for incremental updates
+        self._previous_words = {}
         
         ''' calculate and store grid regions '''
         grids = {} #OrderedDict()
@@ -79,6 +102,46 @@ class BookwormUtility:
         ui.add_button('button8', 'Debug Word Master', callback, 'frame1')        
         ui.add_textout('textout1', 'frame1')
         ui.show()
+        print('Startup: UI shown after {:.2f} s'.format(perf_counter() -
+                                                        started))
+
+    def _load_solver_in_background(self, started):
+        """Return a future of _load_solver() run in a thread. Exceptions
+        are raised by the first _solver() call."""
+        loader = ThreadPoolExecutor(1)
+        future = loader.submit(self._load_solver, started)
+        loader.shutdown(wait = False) #the thread ends after loading
+        return future
+
+    def _load_solver(self, started):
+        """Create the anagram solver and report how long it took."""
+        cache = cachedir.CacheDirectory(self._ac.get('cache', 'path'),
+                                        self._ac.get('cache', 'keep versions'))
+        dictionaries = wordlist.DictionaryRegistry(
+            {option: self._ac.get('dictionaries', option)
+             for option in self._ac.options('dictionaries')}, cache)
+        solver = anagram_solver.AnagramSolver(
+                     min_letters = self._ac.get('anagram','min letters'),
+                     max_letters = self._ac.get('anagram','max letters'),
+                     cache_size = self._ac.get('anagram','cache size'),
+                     dictionaries = self._config_list('anagram',
+                                                      'dictionaries'),
+                     combine = self._ac.get('anagram','combine dictionaries'),
+                     exclude = self._config_list('anagram',
+                                                 'exclude dictionaries'),
+                     registry = dictionaries)
+        info = solver.load_info()
+        print('Startup: word index ready after {:.2f} s ({} start, {:.2f} s'
+              ' loading dictionaries)'.format(
+                  perf_counter() - started,
+                  'cold' if info['built index'] else 'warm', info['seconds']))
+        return solver
+
+    def _solver(self):
+        """Return the anagram solver, waiting for it if still loading."""
+        if not self._anagram.done():
+            print('Waiting for the word index...')
+        return self._anagram.result()
 
     def main_words(self, send_to_ui = True, num_words = None,
                    debug_path = None):
@@ -92,10 +155,11 @@ class BookwormUtility:
         tile_grid = self._get_tile_grid('letter rip grid', debug_path)
         print(tile_grid) ################## DEBUG
         tiles = [tile for tile, position in tile_grid.nodes()]
-        best_words = self._anagram.best_words(tiles, unique_words = True,
+        best_words = self._solver().best_words(tiles, unique_words = True,
                                               low_points = False,
                                               list_limit = num_words,
-                                              min_tiles = 3)
+                                              min_tiles = 3,
+                                              executor = self._executor)
         output_text = self._build_result_text(best_words)
         if send_to_ui: self._send_text_to_ui(output_text)
         
@@ -109,7 +173,8 @@ class BookwormUtility:
         for tile in all_tiles:
             tile.status = 'used count 0'
         final_words = []
-        words = self._anagram.best_words(all_tiles, unique_words = True)
+        words = self._solver().best_words(all_tiles, unique_words = True,
+                                         executor = self._executor)
         # process the words list until all tiles fully used or other condition
         while 1:
             best_word_points = -99999 #ugh. I don't know a better way
@@ -153,10 +218,12 @@ class BookwormUtility:
                                        self._get_wordmaster_status(debug_path)
         print('fixed: ', fixed_tiles) ######################### DEBUG
         print('move: ', wrong_position_tiles) ######################### DEBUG
-        best_words = reversed(self._anagram.best_words(free_tiles, fixed_tiles,
+        best_words = reversed(self._solver().best_words(free_tiles,
+                                              fixed_tiles,
                                               wrong_position_tiles,
                                               max_tiles = 5, min_tiles = 5,
-                                              list_limit = num_words))
+                                              list_limit = num_words,
+                                              executor = self._executor))
         output_text = self._build_result_text(best_words)
         if send_to_ui: self._send_text_to_ui(output_text)
         return output_text
@@ -203,10 +270,33 @@ class BookwormUtility:
         print(tile_grid)
         tiles = [tile for tile, position in tile_grid.nodes() if
                  tile.status != 'locked']
-        best_words = self._anagram.best_words(tiles, unique_words = True,
-                                              list_limit = num_words)
+        # the next turn only searches what changed if none of these words
+        # lost a tile. otherwise update_words is a limited best_words again.
+        # a frame difference only covers positions in both grids, so a failed
+        # (empty) or partial capture would look like an unchanged board
+        positions = self._positions(tile_grid)
+        previous = self._previous_words.pop(grid_name, None)
+        if previous and previous[1] == num_words and positions and \
+           self._positions(previous[0]) == positions:
+            previous_grid, previous_limit, previous_words = previous
+            best_words = self._solver().update_words(previous_words, tiles,
+                                                    tile_grid - previous_grid,
+                                                    unique_words = True,
+                                                    list_limit = num_words,
+                                                    executor = self._executor)
+        else:
+            best_words = self._solver().best_words(tiles, unique_words = True,
+                                                  list_limit = num_words,
+                                                  executor = self._executor)
+        if positions == self._positions(self._grids[grid_name]): #whole grid
+            self._previous_words[grid_name] = (tile_grid, num_words,
+                                               best_words)
         return best_words
 
+    def _positions(self, frame):
+        """Return the positions of the items in frame in order."""
+        return [position for item, position in frame.nodes()]
+
     def _build_result_text(self, tile_words):
         output_list = []
         for word in tile_words:
@@ -218,35 +308,16 @@ class BookwormUtility:
         self._ui.change_text('textout1', output_text)
 
     def _get_tile_grid(self, grid_name, debug_path):
-        letter_grid = self._identify_letters(grid_name, debug_path)
-        status_grid = self._identify_statuses(grid_name, debug_path)
-        tile_grid = BookwormGrid()
-        for tile, [row, col] in letter_grid.nodes():
-            letters = letter_grid.look(row, col).letters
-            status = status_grid.look(row, col).status
-            multipliers = {option: self._ac.get('status multipliers',option) for option in self._ac.options('status multipliers')}
-            points = {option: self._ac.get('letter points',option) for option in self._ac.options('letter points')}
-            tile = BookwormTile(letters, status, multipliers, points)
-            tile_grid.place(tile, row, col)
-        return tile_grid
-
-    def _identify_letters(self, grid_name, debug_path = None):
-        window_title = self._ac.get('game','window title')
-        grid = self._grids[grid_name]
-        if debug_path:
-            window_title = debug_path
-        return self._screen_to_letters.get_data(window_title,
-                                                pcnt_regions = grid)
-
-    def _identify_statuses(self, grid_name, debug_path = None):
         window_title = self._ac.get('game','window title')
-        grid = self._grids[grid_name]
-        ### can get rid of the scale_h junk when scale invariant implemented
-        scale_h = self._ac.get('templates','status parent height')
         if debug_path:
             window_title = debug_path
-        return self._screen_to_status.get_data(window_title,
-                                               pcnt_regions = grid)
+        def combine(letters, status): #template tiles of each head
+            return BookwormTile(letters.letters, status.status,
+                                self._tile_scores)
+        return self._screen_to_tiles.get_data(window_title,
+                                              self._grids[grid_name],
+                                              combine = combine,
+                                              out_frame = BookwormGrid())
         
     def _calc_grid_percents(self, screen_h, screen_w, grid_top, grid_left, step,
                             padding, rows, columns):
@@ -283,7 +354,7 @@ class BookwormUtility:
             f_name = os.path.splitext(file)[0] #just file name
             if f_name == 'empty':
                 f_name = ''
-            tile = BookwormTile(f_name, '', None, None)
+            tile = BookwormTile(f_name, '', None)
             td[index] = {'source':os.path.join(path,file),
                          'output_data':tile} 
         return td
@@ -293,11 +364,33 @@ class BookwormUtility:
         for index, file in enumerate([f for f in os.listdir(path) if
                                       os.path.isfile(os.path.join(path,f))]):
             f_name = os.path.splitext(file)[0] #just file name
-            tile = BookwormTile('', f_name, None, None)
+            tile = BookwormTile('', f_name, None)
             td[index] = {'source':os.path.join(path,file),
                          'output_data':tile} 
         return td
 
+    def _get_capture(self):
+        """Create the screen capture backend chosen in [capture]."""
+        backend = self._ac.get('capture', 'backend')
+        if backend == 'window':
+            return screen_capture.WindowCapture(
+                       settle = self._ac.get('capture', 'settle seconds'),
+                       adaptive = self._ac.get('capture', 'adaptive settle'))
+        if backend == 'files':
+            return screen_capture.FileCapture(
+                       self._ac.get('capture', 'frames path'))
+        if backend == 'shared memory':
+            return screen_capture.SharedMemoryCapture(
+                       self._ac.get('capture', 'shared memory name'))
+        raise ValueError('unknown capture backend: {}'.format(backend))
+
+    def _config_list(self, section, option):
+        """Return an option that may be empty, one value or a list as a list."""
+        value = self._ac.get(section, option)
+        if value is None: return []
+        if isinstance(value, list): return value
+        return [value]
+
     def run_callbacks(self):
         self._ui.run_external_callbacks()
 
@@ -321,16 +414,38 @@ class BookwormGrid(flexframe.FlexFrame):
     def __init__(self):
         super().__init__('row','col')
 
-class BookwormTile(tile.Tile):
-    def __init__(self, letters, status,
-                 status_multipliers, letter_points):
-        attributes = {'letters': letters,
-                      'status': status}
-        super().__init__(**attributes)
-        # these don't represent the identity of a tile so are not included
-        # in the fundamental attributes (e.g. not included in equivalence)
+class BookwormScores:
+    '''
+    Points of each tile kind (letters and status) from the config tables.
+    One instance is shared by all tiles and each kind is only worked out
+    the first time it is asked for.
+    '''
+    def __init__(self, status_multipliers, letter_points):
         self._status_multipliers = status_multipliers
         self._letter_points = letter_points
+        self._points = {} #tile kind: points
+
+    def points(self, kind):
+        try: return self._points[kind]
+        except KeyError: pass
+        letters, status = kind.letters, kind.status
+        if letters in self._letter_points:
+            points = (self._letter_points[letters] *
+                      self._status_multipliers[status])
+        else:
+            points = (sum([self._letter_points[letter.lower()] for letter in letters]) *
+                      self._status_multipliers[status])
+        self._points[kind] = points
+        return points
+
+class BookwormTile(tile.KindTile):
+    __slots__ = ('_scores',)
+
+    def __init__(self, letters, status, scores):
+        super().__init__(letters, status)
+        # scores don't represent the identity of a tile so are not included
+        # in the tile kind (e.g. not included in equivalence)
+        self._scores = scores
 
     def __repr__(self):
         str_list = []
@@ -372,12 +487,9 @@ class BookwormTile(tile.Tile):
 ##        return not __eq__(other)
 
     def points(self):
-        if self.letters in self._letter_points:
-            return (self._letter_points[self.letters] *
-                    self._status_multipliers[self.status])
-        else:
-            return (sum([self._letter_points[letter.lower()] for letter in self.letters]) *
-                    self._status_multipliers[self.status])
+        # looked up by kind, so changing the status (e.g. Link n Spell
+        # marking used tiles) gives the new points
+        return self._scores.points(self.kind)
 
 
 def main():
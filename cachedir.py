@@ -0,0 +1,169 @@
+from contextlib import contextmanager
+import hashlib
+import os
+import time
+
+try: #posix
+    import fcntl
+except ImportError: #windows
+    fcntl = None
+    import msvcrt
+
+# name of the cache directory used when none is given (relative to module)
+DEFAULT_PATH = 'cache'
+
+
+class CacheDirectory:
+    """Directory of compiled files (word indexes) shared between processes.
+
+    Each file is named after what it was built from: the content hash of its
+    source plus the build parameters, so a changed dictionary or setting
+    gets a new file instead of overwriting one that may be in use. Files
+    are written to a temporary name and renamed into place, so readers
+    never see half of one, and a lock file makes sure that only one process
+    builds each file while the others wait and then load it. Only the most
+    recently used versions of each kind of file are kept.
+
+    Public Interface:
+    path()
+    artifact_path()
+    load_or_build()
+    evict()
+
+    """
+    def __init__(self, path = None, keep = 4):
+        """Use a cache directory (created when the first file is saved).
+
+        Keyword Arguments:
+        path -- directory of the files. relative paths are relative to this
+                module. Default: DEFAULT_PATH
+        keep -- number of versions of each kind of file to keep
+
+        """
+        if '__file__' in globals(): #path to this source file
+            this_dir = os.path.abspath(os.path.dirname(__file__))
+        else: #relative path when running IDLE, etc.
+            this_dir = ''
+        self._path = os.path.join(this_dir, path or DEFAULT_PATH)
+        self._keep = keep
+
+    def __reduce__(self): #rebuild from the arguments in other processes
+        return (self.__class__, (self._path, self._keep))
+
+    def __eq__(self, other):
+        if not isinstance(other, CacheDirectory): return NotImplemented
+        return (self._path, self._keep) == (other._path, other._keep)
+
+    def __hash__(self):
+        return hash((self._path, self._keep))
+
+    def path(self):
+        """Return the path of the directory."""
+        return self._path
+
+    def artifact_path(self, kind, source_hash, *parameters):
+        """Return the path of the file of kind built from a source with the
+        given hash (bytes) and build parameters (anything with a stable
+        repr such as numbers, strings and tuples of them)."""
+        key = hashlib.sha256(source_hash)
+        key.update(repr(parameters).encode())
+        return os.path.join(self._path,
+                            '{}-{}.bin'.format(kind, key.hexdigest()[:16]))
+
+    def load_or_build(self, path, load, build):
+        """Return load(path) if the file is current or build it first.
+
+        Arguments:
+        path -- from artifact_path()
+        load -- function of a path that returns the loaded object or raises
+                IOError or ValueError if the file is missing or stale
+        build -- function of a path that builds the object, writes it to the
+                 path (if not None) and returns it
+
+        If the directory can't be written (e.g. read-only install), the
+        object is built with a path of None and nothing is saved.
+
+        """
+        try: return self._used(path, load)
+        except (IOError, ValueError): pass
+        try:
+            os.makedirs(self._path, exist_ok = True)
+            with self._lock(path):
+                #another process may have built it while this one waited
+                try: return self._used(path, load)
+                except (IOError, ValueError): pass
+                temp_path = path + '.tmp' #only the lock holder writes it
+                try:
+                    built = build(temp_path)
+                    self._replace(temp_path, path)
+                finally:
+                    try: os.remove(temp_path)
+                    except OSError: pass
+        except OSError: #not writable. use it from memory
+            return build(None)
+        self.evict(os.path.basename(path).rsplit('-', 1)[0])
+        return built
+
+    def evict(self, kind):
+        """Remove all but the most recently used versions of kind."""
+        prefix = kind + '-'
+        try: names = os.listdir(self._path)
+        except OSError: return
+        paths = [os.path.join(self._path, name) for name in names
+                 if name.startswith(prefix) and name.endswith('.bin')
+                 and '-' not in name[len(prefix):]]
+        def last_used(path):
+            try: return os.path.getmtime(path)
+            except OSError: return 0
+        paths.sort(key = last_used, reverse = True)
+        for path in paths[self._keep:]:
+            #lock files stay: another process may be waiting on this one
+            try: os.remove(path)
+            except OSError: pass #in use (windows) or already removed
+
+    def _used(self, path, load):
+        """Load path and mark it as recently used for evict()."""
+        loaded = load(path)
+        try: os.utime(path)
+        except OSError: pass
+        return loaded
+
+    @staticmethod
+    def _replace(temp_path, path):
+        try: os.replace(temp_path, path)
+        except PermissionError:
+            #windows can't replace a file that is open. since the name
+            #identifies the contents, an existing file is already the same
+            if not os.path.exists(path): raise
+
+    @staticmethod
+    @contextmanager
+    def _lock(path):
+        """Hold an exclusive lock on the lock file of path."""
+        with open(path + '.lock', 'a+b') as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else: #msvcrt only retries for about 10 s so keep trying
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError: time.sleep(0.1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def main():
+    cache = CacheDirectory()
+    print(cache.path())
+
+
+if __name__ == '__main__':
+    main()
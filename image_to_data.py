@@ -1,18 +1,19 @@
-from time import sleep
+from collections import OrderedDict
+import hashlib
 import os.path
 
 import cv2 as cv
 import numpy as np
-import win32ui
-import win32gui
-import win32con
 
 import flexframe
 import autoconfig
+import screen_capture
 
 HEIGHT = 0
 WIDTH = 1
 CHANNELS = 2
+IMAGE_CACHE_SIZE = 8 #prepared images shared by all ImageToData objects
+ROI_CACHE_SIZE = 1024 #classified ROIs kept by each ImageToData object
 ##    -pcnt_regions are defined in % from top left origin
 ##     and must be provided as a flexframe with the following item format:
 ##        {'top':%, 'left':%,'bottom':%, 'right':%}
@@ -21,7 +22,16 @@ CHANNELS = 2
 ##                'output_data':data,
 ##                'template_*method name1*':image,
 ##                ...
-##                'template_*method nameN*':image}}
+##                'template_*method nameN*':image,
+##                'pyramid_*method name1*':[half size image, quarter, ...],
+##                ...}}
+##    -prepared images are cached in _image_cache (shared so that the letter
+##     and status readers of one screenshot only read and crop it once) by:
+##        (source key, crop/shrink settings) for the cropped image and
+##        (source key, crop/shrink settings, method) for the converted image
+##     where source key is the path, mtime and size of a file or the hash of
+##     the pixels of an image
+_image_cache = OrderedDict()
 
 
 class ImageToData:
@@ -34,11 +44,17 @@ class ImageToData:
     crop_to_resolution -- True/False -- crop window frame from images
     crop_to_4to3_aspect -- True/False -- crop widescreen portion from images
     shrink_to_height -- height in pixels for same-aspect ratio shrinking of image
+    coarse_levels -- 0 or times to halve ROIs and templates for a first pass
+    coarse_candidates -- templates per ROI kept from the first pass and
+                         compared again at full size
+    capture -- screen_capture object whose capture(window title) returns the
+               image of sources that aren't files or images
 
     """
     def __init__(self, templates_and_data, method = 'rgb correlation',
                  crop_to_resolution = False, crop_to_4to3_aspect = False,
-                 shrink_to_height = None, resolutions = None):
+                 shrink_to_height = None, resolutions = None,
+                 coarse_levels = 0, coarse_candidates = 3, capture = None):
         """Create the ImageToData object
 
         Arguments:
@@ -52,6 +68,9 @@ class ImageToData:
         crop_to_resolution -- as in class docstring
         crop_to_4to3_aspect -- as in class docstring
         resolutions -- optional. must be provided as [(width,height),...]
+        coarse_levels -- as in class docstring
+        coarse_candidates -- as in class docstring
+        capture -- as in class docstring. Default: WindowCapture()
         
         """
         self._templates_and_data = templates_and_data
@@ -59,6 +78,11 @@ class ImageToData:
         self.crop_to_resolution = crop_to_resolution
         self.crop_to_4to3_aspect = crop_to_4to3_aspect
         self.shrink_to_height = shrink_to_height
+        self.coarse_levels = coarse_levels
+        self.coarse_candidates = coarse_candidates
+        self.capture = capture or screen_capture.WindowCapture()
+        self._spectra = {} #(method, level, roi size): template FFTs
+        self._roi_cache = OrderedDict() #(settings, pixels key): index
 
         #load config from module, not from calling application
         if '__file__' in globals(): #path to this source file
@@ -82,17 +106,64 @@ class ImageToData:
         except RuntimeError as e:
             print(e)
             return out_frame #if a problem getting data, return empty frame
-        for pcnt_region, frame_position in pcnt_regions.nodes():
-            data_index = self._identify(image, pcnt_region)
-            data = self._templates_and_data[data_index]['output_data']
+        for data, (pcnt_region, frame_position) in zip(
+                self._regions_data(image, pcnt_regions), pcnt_regions.nodes()):
             out_frame.place(data, *frame_position)
         return out_frame
 
+    def _regions_data(self, image, pcnt_regions):
+        """Return the data of each region of a prepared image in the order
+        of pcnt_regions.nodes()."""
+        rois = []
+        for pcnt_region, frame_position in pcnt_regions.nodes():
+            left, top, width, height = self._pcnt_region_to_ROI(image,
+                                                                pcnt_region)
+            rois.append(image[top:top+height, left:left+width])
+        # all regions are compared to all templates at once
+        return [self._templates_and_data[data_index]['output_data']
+                for data_index in self._identify_all(rois)]
+
     def _prepare_image(self, source):
+        return self._prepare_loaded(source, *self._load_source(source))
+
+    def _load_source(self, source):
+        """Return (source key, image) for _prepare_loaded. A file is keyed
+        by _source_key and only read if it isn't cached (image is None).
+        Anything else is loaded (e.g. captured) and keyed by its pixels."""
+        source_key = self._source_key(source)
+        if source_key is not None: return source_key, None
         image = self._source_to_image(source)
-        image = self._adjust_for_rules(image)
-        image = self._adjust_for_method(image)
-        return image
+        return _pixels_key(image), image
+
+    def _prepare_loaded(self, source, source_key, image):
+        """Return the source adjusted for rules and method, from the cache
+        if the same file or pixels were prepared with the same settings."""
+        rules_key = (source_key, self.crop_to_resolution,
+                     self.crop_to_4to3_aspect, self.shrink_to_height,
+                     repr(self.ac.get('crop', 'resolutions')))
+        method_key = rules_key + (self.method,)
+        prepared = _cached_image(method_key)
+        if prepared is None:
+            adjusted = _cached_image(rules_key)
+            if adjusted is None:
+                if image is None: image = self._source_to_image(source)
+                adjusted = _cache_image(rules_key,
+                                        self._adjust_for_rules(image))
+            prepared = _cache_image(method_key,
+                                    self._adjust_for_method(adjusted))
+        return prepared
+
+    def _source_key(self, source):
+        """Return a key of a file source that changes with the file or None
+        if source is not a file."""
+        if not isinstance(source, str): return None #image
+        try:
+            if os.path.isfile(source):
+                stat = os.stat(source)
+                return (os.path.abspath(source), stat.st_mtime_ns,
+                        stat.st_size)
+        except: pass # just safely testing for a path
+        return None
 
     def _prepare_template(self, source):
         image = self._source_to_image(source)
@@ -102,27 +173,159 @@ class ImageToData:
     def _prepare_templates(self):
         # only creates templates one time and stores afterward
         name = 'template_' + self.method
+        pyramid_name = 'pyramid_' + self.method
         for index, td in self._templates_and_data.items():
             if name not in td:
                 td[name] = self._prepare_template(td['source'])
+            pyramid = td.setdefault(pyramid_name, [])
+            while len(pyramid) < self.coarse_levels:
+                pyramid.append(cv.pyrDown(pyramid[-1] if pyramid
+                                          else td[name]))
+
+    def _template(self, td, level = 0):
+        """Return the template for the method at a pyramid level."""
+        if level: return td['pyramid_' + self.method][level - 1]
+        return td['template_' + self.method]
 
     def _identify(self, image, pcnt_region):
         left, top, width, height = self._pcnt_region_to_ROI(image, pcnt_region)
-        image = image[top:top+height, left:left+width]
-        t_name = 'template_' + self.method
-        # compare ROI to all templates
-        all_comparisons = {index: 0 for index in self._templates_and_data.keys()}
-        for index, td in self._templates_and_data.items():
-            template = td[t_name] #get appropriate template image for method
-            w_result = image.shape[WIDTH] - template.shape[WIDTH] + 1
-            h_result = image.shape[HEIGHT] - template.shape[HEIGHT] + 1
-            # minimum_loc = cvPoint(0,0)
-            # maximum_loc = cvPoint(0,0)
-            result = cv.matchTemplate(image, template, cv.TM_SQDIFF)
-            min_val, max_val, min_loc, max_loc = cv.minMaxLoc(result)
-            all_comparisons[index] = min_val
-        index = min(all_comparisons, key=all_comparisons.get)
-        return index
+        return self._identify_all([image[top:top+height, left:left+width]])[0]
+
+    def _identify_all(self, rois):
+        """Return the index of the best (lowest SQDIFF) template for each ROI.
+
+        ROIs of the same size are stacked and compared to all templates at
+        once (see _sqdiff_scores), so there is no call per ROI and template.
+        Ties go to the first template, as when comparing one by one.
+        """
+        indexes = list(self._templates_and_data.keys())
+        best = [None] * len(rois)
+        #unchanged ROIs (same pixels and settings) are not compared again
+        settings = (self.method, self.coarse_levels, self.coarse_candidates)
+        keys = [settings + _pixels_key(roi) for roi in rois]
+        stacks = {} #roi shape: [position in rois, ...]
+        for position, roi in enumerate(rois):
+            if keys[position] in self._roi_cache:
+                self._roi_cache.move_to_end(keys[position])
+                best[position] = self._roi_cache[keys[position]]
+            else:
+                stacks.setdefault(roi.shape, []).append(position)
+        for shape, positions in stacks.items():
+            stack = self._stack([rois[position] for position in positions])
+            if self.coarse_levels:
+                scores = self._coarse_to_fine_scores(
+                             stack, [rois[position] for position in positions])
+            else:
+                scores = self._sqdiff_scores(stack)
+            for position, column in zip(positions, scores.argmin(axis = 1)):
+                best[position] = indexes[column]
+                self._roi_cache[keys[position]] = indexes[column]
+        while len(self._roi_cache) > ROI_CACHE_SIZE:
+            self._roi_cache.popitem(last = False)
+        return best
+
+    def _coarse_to_fine_scores(self, stack, rois):
+        """Return scores like _sqdiff_scores, but only for the best few
+        templates of each ROI at coarse_levels (inf for the others).
+
+        The coarse pass compares every template to images a quarter of the
+        size per level and the full size pass only compares each ROI to its
+        own coarse_candidates.
+        """
+        levels = self.coarse_levels
+        coarse_rois = []
+        for roi in rois:
+            for _ in range(levels):
+                roi = cv.pyrDown(roi)
+            coarse_rois.append(roi)
+        coarse_scores = self._sqdiff_scores(self._stack(coarse_rois), levels)
+        count = min(self.coarse_candidates, coarse_scores.shape[1])
+        candidates = np.argsort(coarse_scores, axis = 1,
+                                kind = 'stable')[:, :count]
+        scores = np.full(coarse_scores.shape, np.inf)
+        rows = np.arange(len(rois))[:, np.newaxis]
+        scores[rows, candidates] = self._sqdiff_scores(
+                                       stack, candidates = candidates)
+        return scores
+
+    def _stack(self, rois):
+        """Return same size ROIs as one float array (ROI, row, column,
+        channel)."""
+        stack = np.stack(rois)
+        return stack.reshape(stack.shape[:3] + (-1,)).astype(np.float64)
+
+    def _sqdiff_scores(self, stack, level = 0, candidates = None):
+        """Return a ROI x template matrix of the lowest TM_SQDIFF of each
+        template anywhere within each ROI of stack (ROI, row, column, channel).
+
+        SQDIFF = sum of window squares - 2 * correlation + template squares.
+        Correlations with every template come from one batch of FFTs and
+        window sums of squares from one integral image per ROI.
+
+        Keyword Arguments:
+        level -- pyramid level of the templates (and of the ROIs in stack)
+        candidates -- ROI x K array of the only templates to compare with
+                      each ROI. The result is then ROI x K too.
+
+        """
+        count, height, width, channels = stack.shape
+        spectra, t_shapes, t_squares = self._template_spectra(
+                                           height, width, channels, level)
+        roi_spectra = np.fft.rfft2(stack, axes = (1, 2))
+        if candidates is None:
+            candidates = np.broadcast_to(np.arange(len(spectra)),
+                                         (count, len(spectra)))
+            products = np.einsum('nhwc,thwc->nthw', roi_spectra, spectra)
+        else:
+            products = np.einsum('nhwc,nkhwc->nkhw', roi_spectra,
+                                 spectra[candidates])
+        correlations = np.fft.irfft2(products, s = (height, width))
+        squares = np.zeros((count, height + 1, width + 1))
+        squares[:, 1:, 1:] = (stack * stack).sum(axis = 3).cumsum(axis = 1)\
+                                                          .cumsum(axis = 2)
+        scores = np.full(candidates.shape, np.inf) #inf if it can't fit
+        pair_shapes = t_shapes[candidates]
+        for t_height, t_width in np.unique(pair_shapes.reshape(-1, 2),
+                                           axis = 0):
+            if not t_height: continue #templates that don't fit
+            rows, columns = np.nonzero((pair_shapes[..., 0] == t_height) &
+                                       (pair_shapes[..., 1] == t_width))
+            windows = (squares[:, t_height:, t_width:] -
+                       squares[:, :-t_height, t_width:] -
+                       squares[:, t_height:, :-t_width] +
+                       squares[:, :-t_height, :-t_width])
+            #correlation of each window ends at its bottom right pixel
+            sqdiff = (windows[rows] -
+                      2 * correlations[rows, columns, t_height-1:, t_width-1:] +
+                      t_squares[candidates[rows, columns], np.newaxis,
+                                np.newaxis])
+            scores[rows, columns] = sqdiff.reshape(len(rows), -1).min(axis = 1)
+        return scores
+
+    def _template_spectra(self, height, width, channels, level = 0):
+        """Return the FFTs of all templates flipped and padded to height x
+        width, their (height, width) ((0, 0) if they don't fit) and their
+        sums of squares.
+        Calculated once per method, level and ROI size like the templates."""
+        key = (self.method, level, height, width, channels)
+        if key not in self._spectra:
+            count = len(self._templates_and_data)
+            padded = np.zeros((count, height, width, channels))
+            t_shapes = np.zeros((count, 2), np.intp)
+            t_squares = np.zeros(count)
+            for column, td in enumerate(self._templates_and_data.values()):
+                template = self._template(td, level)
+                template = template.reshape(template.shape[:2] + (-1,))\
+                                   .astype(np.float64)
+                t_height, t_width = template.shape[:2]
+                if t_height > height or t_width > width:
+                    continue #template doesn't fit so it can't match
+                padded[column, :t_height, :t_width] = template[::-1, ::-1]
+                t_shapes[column] = t_height, t_width
+                t_squares[column] = (template * template).sum()
+            self._spectra[key] = (np.fft.rfft2(padded, axes = (1, 2)),
+                                  t_shapes, t_squares)
+        return self._spectra[key]
 
     def _pcnt_region_to_ROI(self, image, region):
         """
@@ -138,14 +341,15 @@ class ImageToData:
 
     def _source_to_image(self, source):
         try:
-            if os.path.isfile(source): #always start with 3 channel rgb
+            if isinstance(source, str) and os.path.isfile(source):
+                #always start with 3 channel rgb
                 return cv.imread(source, flags=cv.IMREAD_COLOR)
         except: pass # just safely testing for a path
         if hasattr(source, 'height'): #lame duck typing for iplimage
             return source
         if hasattr(source, 'shape'):  # test for numpy image
             return source
-        return self._get_screenshot(source) #screenshot if nothing else works
+        return self.capture.capture(source) #screenshot if nothing else works
 
     def _adjust_for_rules(self, image):
         if self.crop_to_resolution:
@@ -197,82 +401,6 @@ class ImageToData:
         avg_image.fill(avg)
         return avg_image #return an image of the average color for consistency
 
-    def _get_screenshot(self, window_title):
-        """ Get the pq hwnd """
-        hwnd = self._get_hwnd(window_title)
-
-        # Get a DC for the client area of the window
-        clientHandle = win32gui.GetDC(hwnd)
-        clientDC = win32ui.CreateDCFromHandle(clientHandle)
-        
-        # Make and connect DC and bitmap for the screenshot image
-        shotDC = clientDC.CreateCompatibleDC()
-        l,t,r,b = win32gui.GetClientRect(hwnd)
-        h = b-t
-        w = r-l
-        bmp = win32ui.CreateBitmap()
-        bmp.CreateCompatibleBitmap(clientDC, w, h)
-        shotDC.SelectObject(bmp)
-        
-        # Copy the client area into the screenshot DC
-        dest_offset = (0,0)
-        size = (w, h)
-        src_offset = (0,0)
-        raster = win32con.SRCCOPY
-
-        # Make window visible and copy it. Certainly kludgy
-        try: #allow it to whack the window without dying
-            win32gui.SetForegroundWindow(hwnd) #can trigger permission error
-##            win32gui.BringWindowToTop(hwnd) #not sure if this helps any
-##            win32gui.SetFocus(hwnd) #doesn't trigger error without permission like setforegroundwindow
-##            win32gui.SetActiveWindow(hwnd) #not sure if this helps any
-        except:
-            pass ### someday...
-        sleep(.2) #lame way to allow screen to draw before taking shot
-        shotDC.BitBlt(dest_offset, size, clientDC, src_offset, raster)
-        
-        ###### THIS SHOULD BE REMOVED BUT... LEAVE UNTIL HAVE  METHOD ###
-        ###### TO PASS IMAGE WITHOUT A FILE. e.g. PIL for 3.x         ###
-        # Scale bitmap if not already a Wx480 resolution
-        if h != 600:
-            h_scaled = 600
-##            if w == 1280:
-##                """ handle non- 4:3 resolutions """
-##                w_scaled = 640
-##            else:
-##                """ handle 4:3 and widescreen resolutions (maybe need to split) """
-            w_scaled = 800 #int(round(w * h_scaled / h)) #kludge until scale invariant working
-            scaledDC = shotDC.CreateCompatibleDC()
-            bmp_scaled = win32ui.CreateBitmap()
-            bmp_scaled.CreateCompatibleBitmap(shotDC, w_scaled, h_scaled)
-            scaledDC.SelectObject(bmp_scaled)
-            scaledDC.StretchBlt((0,0), (w_scaled, h_scaled),
-                                shotDC, (0,0), (w, h),
-                                raster)
-        else:
-            bmp_scaled = bmp
-            scaledDC = shotDC
-        # Get screenshot bitmap into opencv image
-        file_path = 'tmp.bmp'
-        bmp_scaled.SaveBitmapFile(scaledDC, file_path) ##why is a DC needed?
-        ###################################################################
-        image_temp = cv.imread(file_path)
-        os.remove(file_path)
-        return cv.cvtColor(image_temp, cv.COLOR_BGRA2BGR)
-
-    def _get_hwnd(self, window_title):
-        """ get a handle to the window """
-        def _window_callback(hwnd, all_windows):
-            all_windows.append((hwnd, win32gui.GetWindowText(hwnd)))
-        all_windows = []
-        win32gui.EnumWindows(_window_callback, all_windows)
-        if all_windows:
-            hwnd = [hwnd for hwnd, title in all_windows
-                    if window_title in title]
-            if hwnd:
-                return hwnd[0]
-        raise RuntimeError('window not found: ', window_title)
-
     def _crop_to_resolution(self, image):
         if (image.shape[WIDTH], image.shape[HEIGHT]) in self.ac.get('crop','resolutions'):
             return image
@@ -337,6 +465,88 @@ class ImageToData:
         return result
 
 
+class MultiImageToData:
+    """Several ImageToData heads that read the same regions of one image
+    (e.g. the letters and the statuses of the same tiles)
+
+    The image is captured or read once and each head derives its own view
+    from it (heads with the same crop rules share the cropped image and
+    only convert it for their method). The data of all heads is then
+    combined into one item per region.
+
+    Public Interface:
+    get_data()
+
+    """
+    def __init__(self, heads):
+        """Create the MultiImageToData object
+
+        Arguments:
+        heads -- {name: ImageToData}
+
+        """
+        self._heads = heads
+
+    def get_data(self, image_source, pcnt_regions, combine = dict,
+                 out_frame = None):
+        """Return a frame with combine(name=data, ...) of all heads placed at
+        the position of each region.
+
+        Arguments:
+        image_source -- as in ImageToData.get_data
+        pcnt_regions -- as in ImageToData.get_data
+
+        Optional Keyword Arguments:
+        combine -- function of each head's data by name that returns the item
+                   for a region. Default: a dict of the data
+        out_frame -- empty frame to place the items in.
+                     Default: a FlexFrame with the dimensions of pcnt_regions
+
+        """
+        if out_frame is None:
+            out_frame = flexframe.FlexFrame(*pcnt_regions._dimensions)
+        try:
+            first_head = next(iter(self._heads.values()))
+            source_key, image = first_head._load_source(image_source)
+            heads_data = []
+            for name, head in self._heads.items():
+                head_image = head._prepare_loaded(image_source, source_key,
+                                                  image)
+                head._prepare_templates()
+                heads_data.append([(name, data) for data in
+                                   head._regions_data(head_image,
+                                                      pcnt_regions)])
+        except RuntimeError as e:
+            print(e)
+            return out_frame #if a problem getting data, return empty frame
+        for region_data, (pcnt_region, frame_position) in zip(
+                zip(*heads_data), pcnt_regions.nodes()):
+            out_frame.place(combine(**dict(region_data)), *frame_position)
+        return out_frame
+
+
+def _pixels_key(image):
+    """Return a key that identifies an image by its size and pixels."""
+    pixels = hashlib.blake2b(np.ascontiguousarray(image).data,
+                             digest_size = 16).digest()
+    return (image.shape, image.dtype.str, pixels)
+
+
+def _cached_image(key):
+    """Return the image cached by key (as most recently used) or None."""
+    image = _image_cache.get(key)
+    if image is not None: _image_cache.move_to_end(key)
+    return image
+
+
+def _cache_image(key, image):
+    """Cache image by key, drop the least recently used and return it."""
+    _image_cache[key] = image
+    while len(_image_cache) > IMAGE_CACHE_SIZE:
+        _image_cache.popitem(last = False)
+    return image
+
+
 def _debug_display(image, title = 'debug display'):
     if (image.shape[WIDTH] == 1) and (image.shape[HEIGHT] == 1):
         pixel = image[0, 0]
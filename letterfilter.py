@@ -0,0 +1,160 @@
+from itertools import chain
+
+import numpy as np
+
+import wordtrie
+
+_LETTER_BITS = np.uint32(1) << np.arange(wordtrie.ALPHABET_SIZE, dtype=np.uint32)
+
+
+class LetterFilter:
+    """Letter-count signatures of a word list for fast multiset tests.
+
+    Every word is summarized by a 26-lane letter count vector and a 26-bit
+    letter presence mask. Given the letters on a set of tiles, all words
+    that could not possibly be spelled by them (needing a missing letter
+    or too many copies of a letter) are discarded in a few vectorized
+    operations, without walking any tree.
+
+    Public Interface:
+    feasible_words()
+    __len__
+
+    """
+    def __init__(self, words):
+        """Build the signatures.
+
+        Arguments:
+        words -- iterable of lower case words (a-z only)
+
+        """
+        words = list(words)
+        self._words = np.array(words, dtype=np.bytes_)
+        lengths = np.fromiter((len(word) for word in words), dtype=np.intp,
+                              count=len(words))
+        letters = np.frombuffer(''.join(words).encode('ascii'), np.uint8)
+        letters = letters.astype(np.intp) - ord('a')
+        if letters.size and not (0 <= letters.min() and
+                                 letters.max() < wordtrie.ALPHABET_SIZE):
+            raise ValueError('words must only contain the letters a-z')
+        word_ids = np.repeat(np.arange(len(words)), lengths)
+        # count each (word, letter) pair in one flat histogram
+        counts = np.bincount(word_ids * wordtrie.ALPHABET_SIZE + letters,
+                             minlength=len(words) * wordtrie.ALPHABET_SIZE)
+        self._counts = counts.reshape(len(words), wordtrie.ALPHABET_SIZE)\
+                             .astype(np.uint8)
+        self._masks = self._to_mask(self._counts)
+
+    def feasible_words(self, available, required = '', any_of = None,
+                       not_within = None, limit = None):
+        """Return words that can be spelled with a subset of letters.
+
+        Arguments:
+        available -- string of all usable letters, repeated as many times as
+                     they can be used. Case and non a-z characters ignored.
+
+        Keyword Arguments:
+        required -- string of letters that every word must contain
+        any_of -- string of letters of which every word must contain at least
+                  one (None for no restriction)
+        not_within -- leave out words that these letters alone could spell
+        limit -- return None instead if more than this many words qualify
+
+        """
+        available_counts = self._letter_counts(available)
+        available_mask = self._to_mask(available_counts)
+        required_mask = self._to_mask(self._letter_counts(required))
+        masks = self._masks
+        # cheap presence test first, then exact counts for the survivors
+        qualifies = ((masks & ~available_mask) == 0) & \
+                    ((masks & required_mask) == required_mask)
+        if any_of is not None:
+            any_of_mask = self._to_mask(self._letter_counts(any_of))
+            qualifies &= (masks & any_of_mask) != 0
+        candidates = np.flatnonzero(qualifies)
+        counts = self._counts[candidates]
+        fits = (counts <= available_counts).all(axis=1)
+        if not_within is not None:
+            fits &= ~(counts <= self._letter_counts(not_within)).all(axis=1)
+        feasible = candidates[fits]
+        if (limit is not None) and (len(feasible) > limit):
+            return None
+        return [word.decode('ascii') for word in self._words[feasible]]
+
+    def _letter_counts(self, letters):
+        letters = np.frombuffer(letters.lower().encode('ascii', 'ignore'),
+                                np.uint8).astype(np.intp) - ord('a')
+        letters = letters[(0 <= letters) & (letters < wordtrie.ALPHABET_SIZE)]
+        return np.bincount(letters, minlength=wordtrie.ALPHABET_SIZE)
+
+    @staticmethod
+    def _to_mask(counts):
+        """Fold the last axis of letter counts into 26-bit presence masks."""
+        return np.bitwise_or.reduce(np.where(counts > 0, _LETTER_BITS, 0),
+                                    axis=-1).astype(np.uint32)
+
+    def __len__(self):
+        return len(self._words)
+
+
+class CombinedFilter:
+    """feasible_words() of several LetterFilters combined at query time.
+
+    Words come from the union or intersection of the filters, minus the
+    words of the excluded filters (like wordtrie.CombinedTrie), so no
+    signatures are built for a combination.
+
+    Public Interface:
+    feasible_words()
+
+    """
+    def __init__(self, filters, combine = 'union', excluded = ()):
+        """Combine filters.
+
+        Arguments:
+        filters -- LetterFilters
+
+        Keyword Arguments:
+        combine -- 'union' or 'intersection' of the words of filters
+        excluded -- filters whose words are left out
+
+        """
+        self._filters = list(filters)
+        self._intersection = combine == 'intersection'
+        self._excluded = list(excluded)
+
+    def feasible_words(self, available, required = '', any_of = None,
+                       not_within = None, limit = None):
+        """Return distinct words as in LetterFilter.feasible_words."""
+        lists = []
+        for letter_filter in self._filters:
+            words = letter_filter.feasible_words(available, required, any_of,
+                                                 not_within, limit)
+            if words is None: return None #too many in one of them already
+            lists.append(words)
+        if self._intersection:
+            common = set(lists[0]).intersection(*lists[1:])
+            candidates = [word for word in lists[0] if word in common]
+        else:
+            candidates = chain.from_iterable(lists)
+        seen = set()
+        for letter_filter in self._excluded:
+            seen.update(letter_filter.feasible_words(available, required,
+                                                     any_of, not_within))
+        words = []
+        for word in candidates:
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+        if (limit is not None) and (len(words) > limit):
+            return None
+        return words
+
+
+def main():
+    letter_filter = LetterFilter(['a', 'at', 'ate', 'tea', 'teas', 'tease'])
+    print(letter_filter.feasible_words('etas'))
+    print(letter_filter.feasible_words('eetas', required = 'e'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+from time import perf_counter, sleep
+import os
+
+import cv2 as cv
+import numpy as np
+
+try: #windows
+    import win32con
+    import win32gui
+    import win32ui
+except ImportError: #other platforms can only capture files or shared memory
+    win32gui = None
+
+# screenshots are scaled to this (width, height). kludge until matching is
+# scale invariant (all templates and grids are for 800x600)
+SCALED_SIZE = (800, 600)
+# extensions of the frames that FileCapture reads from a directory
+FRAME_EXTENSIONS = ('.bmp', '.png', '.jpg', '.jpeg')
+
+
+class WindowCapture:
+    """Screenshots of the client area of a window, copied from its bitmap
+    straight into an opencv (numpy) image without a temporary file.
+
+    A window that is already in front is captured right away. Otherwise it
+    is brought to the front and given up to settle seconds to draw. With
+    adaptive settling, a frame is captured every poll seconds and waiting
+    stops once stable frames in a row were the same as the one before
+    (one unchanged pair can just be a pause between two redraws).
+
+    Public Interface:
+    capture()
+
+    """
+    def __init__(self, settle = 0.2, adaptive = True, poll = 0.03,
+                 stable = 2):
+        """Create the WindowCapture object
+
+        Keyword Arguments:
+        settle -- seconds to wait (at most, if adaptive) for a window to draw
+                  after bringing it to the front
+        adaptive -- stop waiting once the window stops changing
+        poll -- seconds between the frames compared when adaptive
+        stable -- unchanged frames in a row that end an adaptive wait
+
+        """
+        self.settle = settle
+        self.adaptive = adaptive
+        self.poll = poll
+        self.stable = stable
+
+    def capture(self, window_title):
+        """Return a BGR image of the window with window_title in its title."""
+        if win32gui is None:
+            raise RuntimeError('window capture needs pywin32 (windows only)')
+        hwnd = self._get_hwnd(window_title)
+        if win32gui.GetForegroundWindow() == hwnd:
+            return self._grab(hwnd) #already drawn
+        try: #allow it to whack the window without dying
+            win32gui.SetForegroundWindow(hwnd) #can trigger permission error
+        except:
+            pass ### someday...
+        return self._settled(lambda: self._grab(hwnd))
+
+    def _settled(self, grab):
+        """Return a frame from grab() once the window had time to draw."""
+        if not self.adaptive:
+            sleep(self.settle)
+            return grab()
+        deadline = perf_counter() + self.settle
+        sleep(min(self.poll, self.settle)) #let it start drawing
+        frame = grab()
+        unchanged = 0
+        while perf_counter() < deadline:
+            sleep(self.poll)
+            previous, frame = frame, grab()
+            if not np.array_equal(previous, frame): unchanged = 0
+            else: unchanged += 1
+            if unchanged >= self.stable: break #finished drawing
+        return frame
+
+    def _grab(self, hwnd):
+        """Return the client area of hwnd as a BGR image, scaled to
+        SCALED_SIZE unless it is already as high (wide screens are cropped
+        later)."""
+        # Get a DC for the client area of the window
+        client_handle = win32gui.GetDC(hwnd)
+        client_dc = win32ui.CreateDCFromHandle(client_handle)
+        shot_dc = client_dc.CreateCompatibleDC()
+        l, t, r, b = win32gui.GetClientRect(hwnd)
+        width, height = r - l, b - t
+        bitmap = win32ui.CreateBitmap()
+        try:
+            bitmap.CreateCompatibleBitmap(client_dc, width, height)
+            shot_dc.SelectObject(bitmap)
+            shot_dc.BitBlt((0, 0), (width, height), client_dc, (0, 0),
+                           win32con.SRCCOPY)
+            # the bits of a (32 bit) screen bitmap are BGRX rows, top first
+            bits = bitmap.GetBitmapBits(True)
+        finally:
+            shot_dc.DeleteDC()
+            client_dc.DeleteDC()
+            win32gui.ReleaseDC(hwnd, client_handle)
+            win32gui.DeleteObject(bitmap.GetHandle())
+        if len(bits) != width * height * 4:
+            raise RuntimeError('unsupported screen color depth')
+        pixels = np.frombuffer(bits, np.uint8).reshape(height, width, 4)
+        if height != SCALED_SIZE[1]:
+            return cv.resize(pixels[:, :, :3], SCALED_SIZE,
+                             interpolation = cv.INTER_AREA)
+        return np.ascontiguousarray(pixels[:, :, :3])
+
+    def _get_hwnd(self, window_title):
+        """ get a handle to the window """
+        def _window_callback(hwnd, all_windows):
+            all_windows.append((hwnd, win32gui.GetWindowText(hwnd)))
+        all_windows = []
+        win32gui.EnumWindows(_window_callback, all_windows)
+        if all_windows:
+            hwnd = [hwnd for hwnd, title in all_windows
+                    if window_title in title]
+            if hwnd:
+                return hwnd[0]
+        raise RuntimeError('window not found: ', window_title)
+
+
+class FileCapture:
+    """Frames read from an image file or from a directory of images (one
+    per capture in name order, then the last one again). Works on any
+    platform, e.g. to replay recorded screens.
+
+    Public Interface:
+    capture()
+
+    """
+    def __init__(self, path):
+        """Create the FileCapture object
+
+        Arguments:
+        path -- image file or directory of FRAME_EXTENSIONS images
+
+        """
+        if os.path.isdir(path):
+            self._paths = [os.path.join(path, name)
+                           for name in sorted(os.listdir(path))
+                           if name.lower().endswith(FRAME_EXTENSIONS)]
+        else:
+            self._paths = [path]
+        self._next = 0
+
+    def capture(self, window_title = None):
+        """Return the next frame as a BGR image (window_title is ignored)."""
+        if not self._paths: raise RuntimeError('no frames to capture')
+        path = self._paths[min(self._next, len(self._paths) - 1)]
+        self._next += 1
+        image = cv.imread(path, flags = cv.IMREAD_COLOR)
+        if image is None: raise RuntimeError('unable to read frame: ', path)
+        return image
+
+
+class SharedMemoryCapture:
+    """Frames that another process writes to a named shared memory buffer
+    as BGR pixels (height x width x 3 bytes). Works on any platform.
+
+    Public Interface:
+    capture()
+    close()
+
+    """
+    def __init__(self, name, height = SCALED_SIZE[1], width = SCALED_SIZE[0]):
+        """Attach to the shared memory buffer with name (which must exist)."""
+        from multiprocessing import shared_memory
+        self._memory = shared_memory.SharedMemory(name)
+        self._shape = (height, width, 3)
+        if self._memory.size < height * width * 3:
+            self._memory.close()
+            raise ValueError('shared memory is smaller than a frame')
+
+    def capture(self, window_title = None):
+        """Return a copy of the current frame (window_title is ignored) so
+        that it doesn't change while it is being read."""
+        return np.ndarray(self._shape, np.uint8, self._memory.buf).copy()
+
+    def close(self):
+        """Detach from the buffer (the writer still owns it)."""
+        self._memory.close()
+
+
+def main():
+    pass
+
+
+if __name__ == '__main__':
+    main()
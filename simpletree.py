@@ -5,92 +5,58 @@ from collections import deque
 ### but to change parent, graft/trim should be used. same for children
 ### check all cases of parent/children to make sure can be replaced.
 
-class TreeNode():
-    """Nodes of a tree. Each node can act as the root of it's own tree
+class _TreeMethods:
+    """Tree algorithms shared by the node classes of this module.
 
-    Public Interface:
-    Focused on Node:
-    data -- dictionary with arbitrary contents. accessible by [] notation
-    parent()
-    children()
-    children_by_data()
-    trim_children()
-    depth()
+    They only use parent(), children(), trim() and node[key], so each
+    node class just has to provide those (plus graft() and depth()).
 
-    Focused on Tree:
-    traverse()
-    traverse_post_order()
-    graft()
-    route_to_root()
-    route_from_root()
-    leaves()
-    trim()
-    trim_dead_branch()
-    degenerate_to_leaf()
-    search()
-    
+    Node classes also keep children indexed by the value of INDEX_KEY (if
+    declared with indexed_by()) in _index, using the helpers below.
     """
+    __slots__ = ()
+    INDEX_KEY = None
 
-    ### get rid of either kwargs or data_. probably kwargs since less flexible
-    def __init__(self, *args, data_ = None, **kwargs):
-        """Construct a SimpleNode with optional data.
-
-        keyword-only arguments:
-        data_ -- a dictionary with arbitrary data
-
-        kwargs:
-        any set of name=value pairs will be (over)written in the node's data.
-
-        """
-        self._parent = None
-        self._children = []
-        self.data = data_ if data_ else {}
-        for name, value in kwargs.items():
-            self.data[name] = value
-        
-    def __eq__(self, other):
-        if id(self) == id(other): return True
-        return False
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
-
-    def __getitem__(self, key):
-        return self.data[key]
-
-    def __setitem__(self, key, value):
-        self.data[key] = value
-
-    def parent(self):
-        """Return the parent of this node."""
-        return self._parent
-
-    def children(self):
-        """Generate each child of this node."""
-        for child in self._children:
-            yield child
+    @classmethod
+    def indexed_by(cls, key):
+        """Return a subclass of this node class that indexes children by the
+        value of their data key, so children_by_data(key, value) is a dict
+        lookup. Values of key must be hashable. The index follows graft,
+        trim and node[key] = value (but not changes made through data)."""
+        return type(cls.__name__, (cls,), {'__slots__': (), 'INDEX_KEY': key})
 
     def children_by_data(self, data_name, data_value):
         """Generate all children that have same data or None if not found."""
+        if self.INDEX_KEY is not None and data_name == self.INDEX_KEY:
+            try: return iter(tuple(self._index.get(data_value, ())))
+            except TypeError: return iter(()) #unhashable so never indexed
+        return self._scan_children_by_data(data_name, data_value)
+
+    def _scan_children_by_data(self, data_name, data_value):
         for child in self.children():
             try:
-                if child.data[data_name] == data_value: yield child
+                if child[data_name] == data_value: yield child
             except KeyError: continue
 
-    def graft(self, child):
-        """Append child to self's children and set child's parent to self.
-        Note: For performance reasons, this assumes that child does not already
-        exist in any tree connected to self rather than testing for it."""
-        self._children.append(child)
-        child._parent = self
-
-    def trim(self):
-        """Remove branch_root from any tree it was connected to."""
-        try:
-            self._parent._children.remove(self)
-        except AttributeError: pass #if parent is none, ignore.
-        #ValueError for child not being in parent will still propagate
-        self._parent = None
+    def _index_child(self, child):
+        """Add child to the index of self's children."""
+        try: value = child[self.INDEX_KEY]
+        except KeyError: return #children without the key are not indexed
+        self._index.setdefault(value, []).append(child)
+
+    def _unindex_child(self, child):
+        """Remove child from the index of self's children."""
+        try: value = child[self.INDEX_KEY]
+        except KeyError: return
+        siblings = self._index[value]
+        siblings.remove(child)
+        if not siblings: del self._index[value]
+
+    def _reindex_children(self):
+        """Rebuild the index of self's children in order of the children."""
+        self._index = {}
+        for child in self.children():
+            self._index_child(child)
 
     def trim_children(self):
         """Trim and return a list of children."""
@@ -99,15 +65,6 @@ class TreeNode():
             child.trim()
         return child_list
 
-    def depth(self):
-        """Find depth relative to full tree."""
-        d = 0
-        node = self
-        while node.parent():
-            node = node.parent()
-            d += 1
-        return d
-
     def route_to_root(self):
         """ Generate nodes ordered from self to root"""
         node = self
@@ -118,24 +75,25 @@ class TreeNode():
             yield node
 
     def route_from_root(self):
-        """"Fake" generate nodes ordered from root to self."""
-        for node in reversed(list(self.route_to_root())): yield node
+        """Generate nodes ordered from root to self.
+        Only the route itself (depth + 1 nodes) is held in memory."""
+        route = list(self.route_to_root())
+        while route: yield route.pop()
 
-### untested in unittests
     def route_to_ancestor(self, ancestor):
-        """"Fake" generate nodes ordered from self to ancestor."""
-        for node in reversed(list(self.route_from_ancestor(ancestor))):
-            yield node
-
-    def route_from_ancestor(self, ancestor):
-        """Generate nodes ordered from ancestor to self."""
-        node = ancestor
+        """Generate nodes ordered from self to ancestor."""
+        node = self
         yield node
-        while node != self:
+        while node != ancestor:
             node = node.parent()
             if node == None: raise ValueError('The node must be an ancestor of self.')
             yield node
 
+    def route_from_ancestor(self, ancestor):
+        """Generate nodes ordered from ancestor to self."""
+        route = list(self.route_to_ancestor(ancestor)) #raise before yielding
+        while route: yield route.pop()
+
     def traverse(self):
         """In-order generate all nodes in tree with self as root."""
         stack = deque()
@@ -148,15 +106,57 @@ class TreeNode():
             yield node
 
     def traverse_post_order(self):
-        """Post-order "Fake" generate all nodes in tree with self as root."""
-        ###is there a way to do this without making a full list? probably.
-        for node in reversed(list(self.traverse())):
-            yield node
+        """Post-order generate all nodes in tree with self as root.
+
+        The order is the reverse of traverse() (last child first). Only the
+        current route and the children lists along it are kept in memory,
+        so the node just generated can be trimmed safely."""
+        stack = [(self, reversed(list(self.children())))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                stack.append((child, reversed(list(child.children()))))
+                break
+            else:
+                stack.pop()
+                yield node
 
     def leaves(self):
         """Generate all leaves of tree with self as root."""
-        for node in self.traverse():
-            if not list(node.children()): yield node
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            children = list(node.children())
+            if children: stack.extend(reversed(children))
+            else: yield node
+
+    def prune_where(self, predicate):
+        """Trim all dead branches below self in one pass and return a list of
+        the trimmed branch roots.
+
+        A node is dead if predicate(node) is true and all of its children are
+        dead (so leaves only need the predicate). predicate is only called for
+        nodes whose children are all dead. self is never trimmed.
+
+        """
+        trimmed = []
+        #stack items: [node, remaining children, dead children, all dead]
+        stack = [[self, iter(list(self.children())), [], True]]
+        while stack:
+            item = stack[-1]
+            for child in item[1]:
+                stack.append([child, iter(list(child.children())), [], True])
+                break
+            else:
+                node, children, dead_children, all_dead = stack.pop()
+                if stack and all_dead and predicate(node):
+                    stack[-1][2].append(node) #parent decides whether to trim
+                    continue
+                if stack: stack[-1][3] = False
+                for child in dead_children:
+                    child.trim()
+                trimmed.extend(dead_children)
+        return trimmed
 
     def trim_dead_branch(self,
                          stop_data_key = None,
@@ -176,7 +176,7 @@ class TreeNode():
             parent = dead_node.parent()
             if len(list(parent.children())) > 1: break #parent is non-degenerate
             try: #parent has stop data
-                if parent.data[stop_data_key] == stop_data_value: break 
+                if parent[stop_data_key] == stop_data_value: break 
             except KeyError: pass
             if not parent.parent(): break #parent is full tree root
             dead_node = parent
@@ -227,7 +227,216 @@ class TreeNode():
                     break
             if found: yield node
 
+
+class TreeNode(_TreeMethods):
+    """Nodes of a tree. Each node can act as the root of it's own tree
+
+    Public Interface:
+    Focused on Node:
+    data -- dictionary with arbitrary contents. accessible by [] notation
+    parent()
+    children()
+    children_by_data()
+    trim_children()
+    depth()
+
+    Focused on Tree:
+    traverse()
+    traverse_post_order()
+    graft()
+    route_to_root()
+    route_from_root()
+    route_to_ancestor()
+    route_from_ancestor()
+    leaves()
+    trim()
+    trim_dead_branch()
+    prune_where()
+    degenerate_to_leaf()
+    search()
+
+    Indexing:
+    indexed_by() -- node class with children indexed by one data key
     
+    """
+
+    ### get rid of either kwargs or data_. probably kwargs since less flexible
+    def __init__(self, *args, data_ = None, **kwargs):
+        """Construct a SimpleNode with optional data.
+
+        keyword-only arguments:
+        data_ -- a dictionary with arbitrary data
+
+        kwargs:
+        any set of name=value pairs will be (over)written in the node's data.
+
+        """
+        self._parent = None
+        self._children = []
+        self._index = {} if self.INDEX_KEY is not None else None
+        self.data = data_ if data_ else {}
+        for name, value in kwargs.items():
+            self.data[name] = value
+        
+    def __eq__(self, other):
+        if id(self) == id(other): return True
+        return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        if key == self.INDEX_KEY and self._parent is not None:
+            self._parent._reindex_children()
+
+    def parent(self):
+        """Return the parent of this node."""
+        return self._parent
+
+    def children(self):
+        """Generate each child of this node."""
+        for child in self._children:
+            yield child
+
+    def graft(self, child):
+        """Append child to self's children and set child's parent to self.
+        Note: For performance reasons, this assumes that child does not already
+        exist in any tree connected to self rather than testing for it."""
+        self._children.append(child)
+        child._parent = self
+        if self.INDEX_KEY is not None: self._index_child(child)
+
+    def trim(self):
+        """Remove branch_root from any tree it was connected to."""
+        try:
+            self._parent._children.remove(self)
+        except AttributeError: pass #if parent is none, ignore.
+        #ValueError for child not being in parent will still propagate
+        else:
+            if self.INDEX_KEY is not None: self._parent._unindex_child(self)
+        self._parent = None
+
+    def depth(self):
+        """Find depth relative to full tree."""
+        d = 0
+        node = self
+        while node.parent():
+            node = node.parent()
+            d += 1
+        return d
+
+
+_UNSET = object() #value of a field that was never set
+
+class CompactTreeNode(_TreeMethods):
+    """Memory-light tree node with a fixed set of data fields.
+
+    Same public interface as TreeNode with these differences:
+    -data can only hold the names in FIELDS. Subclass and set FIELDS or
+     use with_fields(). Values live in one list per node instead of a dict
+    -data returns a new dict each time, so set values with node[key] = value
+    -children() returns the tuple of children, which is replaced (not
+     changed) by graft and trim
+    -depth() is kept up to date by graft and trim instead of walking to
+     the root on each call
+    -nodes have __slots__, so no other attributes can be added
+
+    Public Interface (in addition to TreeNode):
+    FIELDS -- names of the data fields
+    with_fields() -- can be combined with indexed_by()
+
+    """
+    __slots__ = ('_parent', '_children', '_depth', '_values', '_index')
+    FIELDS = ()
+    _columns = {} #field name: index into _values
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._columns = {name: index for index, name in enumerate(cls.FIELDS)}
+
+    @classmethod
+    def with_fields(cls, *names):
+        """Return a subclass of this node class with the given FIELDS."""
+        return type(cls.__name__, (cls,), {'__slots__': (), 'FIELDS': names})
+
+    def __init__(self, *args, data_ = None, **kwargs):
+        """Construct a CompactTreeNode with optional data.
+
+        keyword-only arguments:
+        data_ -- a dictionary with values for some of the FIELDS
+
+        kwargs:
+        any set of field=value pairs will be (over)written in the node's data.
+
+        """
+        self._parent = None
+        self._children = ()
+        self._depth = 0
+        self._index = {} if self.INDEX_KEY is not None else None
+        self._values = [_UNSET] * len(self.FIELDS)
+        for name, value in (data_ or {}).items():
+            self[name] = value
+        for name, value in kwargs.items():
+            self[name] = value
+
+    @property
+    def data(self):
+        """Return a dict of the fields that have a value."""
+        return {name: value for name, value in zip(self.FIELDS, self._values)
+                if value is not _UNSET}
+
+    def __getitem__(self, key):
+        value = self._values[self._columns[key]] #unknown fields: KeyError
+        if value is _UNSET: raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._values[self._columns[key]] = value
+        if key == self.INDEX_KEY and self._parent is not None:
+            self._parent._reindex_children()
+
+    def parent(self):
+        """Return the parent of this node."""
+        return self._parent
+
+    def children(self):
+        """Return the tuple of children of this node."""
+        return self._children
+
+    def graft(self, child):
+        """Append child to self's children and set child's parent to self.
+        Note: For performance reasons, this assumes that child does not already
+        exist in any tree connected to self rather than testing for it."""
+        self._children += (child,)
+        child._parent = self
+        child._shift_depth(self._depth + 1 - child._depth)
+        if self.INDEX_KEY is not None: self._index_child(child)
+
+    def trim(self):
+        """Remove branch_root from any tree it was connected to."""
+        parent = self._parent
+        if parent is not None:
+            children = parent._children
+            index = children.index(self) #ValueError if not a child
+            parent._children = children[:index] + children[index + 1:]
+            if parent.INDEX_KEY is not None: parent._unindex_child(self)
+            self._parent = None
+            self._shift_depth(-self._depth)
+
+    def depth(self):
+        """Return depth relative to full tree."""
+        return self._depth
+
+    def _shift_depth(self, change):
+        """Add change to the depth of self and everything below it."""
+        if change:
+            for node in self.traverse():
+                node._depth += change
+
 
 def main():
     pass
@@ -0,0 +1,400 @@
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import cachedir
+import tile
+import wordlist
+from anagram_solver import *
+from bookworm_utility import BookwormGrid, BookwormScores, BookwormTile
+
+WORDS = ['at', 'ta', 'eat', 'tea', 'ate', 'eta', 'sea', 'set', 'tas', 'ask',
+         'oak', 'oat', 'rot', 'sort', 'rock', 'cork', 'rocks', 'cock',
+         'crock', 'stock', 'stack', 'track', 'seat', 'east', 'eats', 'teas',
+         'etas', 'sate', 'tease', 'toast', 'coast', 'actor', 'react',
+         'trace', 'crate', 'cater', 'caters', 'reacts', 'traces', 'crates',
+         'coats', 'tacos', 'costa', 'scrota', 'actors', 'castor', 'orcas',
+         'oats', 'stoat', 'stoats', 'kate%', 'trek', 'treks', 'soak']
+POINTS = dict(zip('acekorst', [1, 3, 1, 4, 2, 2, 1, 2]))
+
+
+SCORES = BookwormScores({'normal': 1, 'ruby': 2}, POINTS)
+
+
+class PointsTile(tile.Tile):
+    """Tile with letters and status worth points by letter (x2 if ruby)."""
+    def __init__(self, letters, status = 'normal'):
+        super().__init__(letters = letters, status = status)
+
+    def points(self):
+        points = sum(POINTS[letter] for letter in self.letters.lower())
+        return points * (2 if self.status == 'ruby' else 1)
+
+
+def tiles(letters, status = 'normal'):
+    return [PointsTile(letter, status) for letter in letters]
+
+
+def spelled(word):
+    return ''.join(tile_.letters for tile_ in word).lower()
+
+
+def brute_force(free_tiles, fixed_tiles = (), min_tiles = 1, max_tiles = None,
+                low_points = False, words = WORDS):
+    """Return {string: best score} of every arrangement of the tiles that
+    spells a word, by trying all of them (lowest score if low_points)."""
+    better = min if low_points else max
+    words = set(word.replace('%', '') for word in words)
+    fixed_tiles = list(fixed_tiles or [])
+    longest = len(free_tiles) + len([t for t in fixed_tiles if t])
+    best = {}
+    for length in range(1, longest + 1):
+        if length < (min_tiles or 0) or (max_tiles and length > max_tiles):
+            continue
+        #fixed tiles past the end of the word don't matter
+        fixed_here = fixed_tiles[:length] + [None] * (length - len(fixed_tiles))
+        free_count = fixed_here.count(None)
+        #as in the search, a word only goes on while free tiles are left
+        if length > 1 and fixed_here[:-1].count(None) >= len(free_tiles):
+            continue
+        for chosen in itertools.permutations(free_tiles, free_count):
+            chosen = iter(chosen)
+            word = [fixed or next(chosen) for fixed in fixed_here]
+            string = spelled(word)
+            if string in words:
+                score = sum(tile_.points() for tile_ in word)
+                best[string] = better(score, best.get(string, score))
+    return best
+
+
+class SolverTestCase(unittest.TestCase):
+    """Solver of WORDS with its indexes in a temporary cache directory."""
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        path = os.path.join(cls.directory, 'words.txt')
+        with open(path, 'w') as f:
+            f.write('\n'.join(WORDS))
+        cls.registry = wordlist.DictionaryRegistry(
+                           {'words': path},
+                           cachedir.CacheDirectory(cls.directory))
+        cls.solver = AnagramSolver(min_letters = 2, dictionaries = 'words',
+                                   registry = cls.registry)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def assertBruteForce(self, solved, *args, **kwargs):
+        """Unique words match brute_force() and come best first."""
+        found = {spelled(word): sum(tile_.points() for tile_ in word)
+                 for word in solved}
+        self.assertEqual(len(found), len(solved))
+        self.assertEqual(found, brute_force(*args, **kwargs))
+        scores = [sum(tile_.points() for tile_ in word) for word in solved]
+        self.assertEqual(scores, sorted(scores, reverse = not kwargs.get(
+                                                    'low_points', False)))
+
+    def random_tiles(self, rng, count, tile_type = PointsTile, *args):
+        return [tile_type(rng.choice('acekorst'),
+                          rng.choice(['normal', 'normal', 'ruby']), *args)
+                for number in range(count)]
+
+    def assertSameTiles(self, words, expected):
+        """Same tile objects in the same order."""
+        self.assertEqual([[id(tile_) for tile_ in word] for word in words],
+                         [[id(tile_) for tile_ in word] for word in expected])
+
+
+class Test_BestWords(SolverTestCase):
+    def setUp(self):
+        self.solver.clear_cache()
+
+    def test_random_tiles(self):
+        rng = random.Random(1)
+        for trial in range(30):
+            free_tiles = self.random_tiles(rng, rng.randint(3, 7))
+            for options in ({}, {'low_points': True}, {'min_tiles': 4},
+                            {'min_tiles': 3, 'max_tiles': 4}):
+                words = self.solver.best_words(free_tiles, **options)
+                self.assertBruteForce(words, free_tiles, **options)
+
+    def test_not_unique_words(self):
+        free_tiles = tiles('teas') + tiles('a', 'ruby')
+        words = self.solver.best_words(free_tiles, unique_words = False)
+        found = [spelled(word) for word in words]
+        self.assertGreater(len(found), len(set(found))) #two a tiles
+        self.assertEqual(set(found), set(brute_force(free_tiles)))
+        for word in words: #every word uses distinct tiles
+            self.assertEqual(len(set(map(id, word))), len(word))
+        scores = [sum(tile_.points() for tile_ in word) for word in words]
+        self.assertEqual(scores, sorted(scores, reverse = True))
+
+    def test_list_limit_is_start_of_full_list(self):
+        #the branch and bound search keeps the same words as the full sort
+        rng = random.Random(2)
+        for trial in range(30):
+            free_tiles = self.random_tiles(rng, rng.randint(3, 7))
+            for unique_words, low_points in itertools.product((True, False),
+                                                              repeat = 2):
+                options = dict(unique_words = unique_words,
+                               low_points = low_points)
+                all_words = self.solver.best_words(free_tiles, **options)
+                for list_limit in (1, 3, 10):
+                    self.assertSameTiles(
+                        self.solver.best_words(free_tiles,
+                                               list_limit = list_limit,
+                                               **options),
+                        all_words[:list_limit])
+
+
+class Test_ResultCache(SolverTestCase):
+    def setUp(self):
+        self.solver.clear_cache()
+
+    def test_hits_and_misses(self):
+        free_tiles = tiles('ctsa') + tiles('e', 'ruby')
+        words = self.solver.best_words(free_tiles)
+        #same kinds of tiles in another order
+        reordered = tiles('e', 'ruby') + tiles('astc')
+        again = self.solver.best_words(reordered)
+        self.assertEqual(self.solver.cache_info()['hits'], 1)
+        self.assertEqual(sorted(map(spelled, again)),
+                         sorted(map(spelled, words)))
+        self.assertTrue(all(tile_ in reordered for word in again
+                            for tile_ in word))
+        self.assertBruteForce(again, reordered)
+        #another limit or a changed status is another query
+        self.solver.best_words(reordered, list_limit = 2)
+        reordered[0].status = 'normal'
+        changed = self.solver.best_words(reordered)
+        self.assertBruteForce(changed, reordered)
+        self.assertEqual(self.solver.cache_info(),
+                         {'hits': 1, 'misses': 3, 'size': 3, 'max size': 32})
+
+    def test_least_recently_used(self):
+        solver = AnagramSolver(min_letters = 2, cache_size = 2,
+                               dictionaries = 'words', registry = self.registry)
+        for letters in ('tea', 'oat', 'tea', 'rock', 'tea', 'oat'):
+            solver.best_words(tiles(letters))
+        #oat was dropped for rock, tea was used most recently each time
+        self.assertEqual(solver.cache_info(),
+                         {'hits': 2, 'misses': 4, 'size': 2, 'max size': 2})
+
+
+class Test_ParallelSearch(SolverTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.executor = ProcessPoolExecutor(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+        super().tearDownClass()
+
+    def test_same_as_search(self):
+        rng = random.Random(3)
+        for trial in range(10):
+            free_tiles = self.random_tiles(rng, rng.randint(4, 7),
+                                           BookwormTile, SCORES)
+            for options in ({}, {'list_limit': 5},
+                            {'unique_words': False, 'list_limit': 5},
+                            {'low_points': True}):
+                self.solver.clear_cache()
+                expected = self.solver.best_words(free_tiles, **options)
+                self.solver.clear_cache()
+                self.assertSameTiles(
+                    self.solver.best_words(free_tiles,
+                                           executor = self.executor,
+                                           **options),
+                    expected)
+
+    def test_update_words_falls_back_to_executor(self):
+        submitted = []
+        class Executor:
+            def submit(executor, *args):
+                submitted.append(args)
+                return self.executor.submit(*args)
+        board = [BookwormTile(letter, 'normal', SCORES)
+                 for letter in 'stackore']
+        previous_words = self.solver.best_words(board, list_limit = 3)
+        played = previous_words[0]
+        new_board = [BookwormTile('e', 'normal', SCORES)
+                     if any(tile_ is played_ for played_ in played) else tile_
+                     for tile_ in board]
+        placed = [tile_ for tile_ in new_board
+                  if not any(tile_ is old for old in board)]
+        #a limited list that lost a word is searched again
+        self.solver.clear_cache()
+        words = self.solver.update_words(previous_words, new_board,
+                                         (placed, played), list_limit = 3,
+                                         executor = Executor())
+        self.assertTrue(submitted)
+        self.solver.clear_cache()
+        self.assertSameTiles(words,
+                             self.solver.best_words(new_board, list_limit = 3))
+
+
+class Test_FixedTiles(SolverTestCase):
+    def test_shorter_words_than_fixed_position(self):
+        #regression: a fixed tile past min_tiles removed all shorter words
+        free_tiles = tiles('tea')
+        fixed_tiles = [None, None, None, PointsTile('s')]
+        words = self.solver.best_words(free_tiles, fixed_tiles)
+        self.assertEqual(sorted(map(spelled, words)),
+                         ['at', 'ate', 'eat', 'eta', 'ta', 'tea'])
+        self.assertBruteForce(words, free_tiles, fixed_tiles)
+
+    def test_words_through_fixed_position(self):
+        free_tiles = tiles('teao')
+        fixed_tiles = [None, None, None, PointsTile('s')]
+        words = self.solver.best_words(free_tiles, fixed_tiles, min_tiles = 4)
+        self.assertEqual(sorted(map(spelled, words)),
+                         ['eats', 'etas', 'oats', 'teas'])
+        self.assertBruteForce(words, free_tiles, fixed_tiles, min_tiles = 4)
+
+
+class Test_CustomDictionary(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'custom.txt')
+        with open(path, 'w', encoding = 'utf-8') as f:
+            f.write('\n'.join(["Don't", 'café', 'face', 'ACE', 'x-ray']))
+        self.registry = wordlist.DictionaryRegistry(
+                            {'custom': path},
+                            cachedir.CacheDirectory(self.directory))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_words_outside_a_to_z(self):
+        #words that tiles can't spell don't stop the solver
+        solver = AnagramSolver(dictionaries = 'custom',
+                               registry = self.registry)
+        words = solver.best_words([tile.Tile(letters = letter)
+                                   for letter in 'cafedont'])
+        self.assertEqual(sorted(map(spelled, words)), ['ace', 'cafe', 'face'])
+
+
+class Test_CombinedDictionaries(SolverTestCase):
+    EXTRA = ['cat', 'cats', 'act', 'acts', 'tack', 'tacks', 'sock', 'socket',
+             'coast', 'oats', 'stake']
+    DENY = ['cock', 'cats', 'scrota']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name, words in (('extra', cls.EXTRA), ('deny', cls.DENY)):
+            path = os.path.join(cls.directory, name + '.txt')
+            with open(path, 'w') as f:
+                f.write('\n'.join(words))
+            cls.registry.register(name, path)
+
+    def tearDown(self):
+        self.solver.use_dictionaries('words')
+        self.solver.QUERY_TRIE_LIMIT = AnagramSolver.QUERY_TRIE_LIMIT
+
+    def assertCombination(self, words, *combination):
+        free_tiles = tiles('scotkae')
+        self.solver.use_dictionaries(*combination)
+        for limit in (AnagramSolver.QUERY_TRIE_LIMIT, 0): #0: full index
+            self.solver.QUERY_TRIE_LIMIT = limit
+            self.solver.clear_cache()
+            self.assertBruteForce(self.solver.best_words(free_tiles),
+                                  free_tiles, words = words)
+
+    def test_union_and_exclude(self):
+        self.assertCombination(set(WORDS + self.EXTRA) - set(self.DENY),
+                               ['words', 'extra'], 'union', 'deny')
+
+    def test_intersection(self):
+        self.assertCombination(set(WORDS) & set(self.EXTRA),
+                               ['words', 'extra'], 'intersection')
+
+    def test_no_index_per_combination(self):
+        for combination in ((['words', 'extra'], 'union', 'deny'),
+                            (['extra', 'words'], 'intersection'),
+                            (['deny'],)):
+            self.solver.use_dictionaries(*combination)
+        indexes = [name for name in os.listdir(self.directory)
+                   if name.startswith('wordindex-') and name.endswith('.bin')]
+        self.assertEqual(len(indexes), 3) #one per dictionary
+
+    def test_combination_changes_cache_key(self):
+        free_tiles = tiles('cats')
+        self.solver.use_dictionaries(['words', 'extra'])
+        self.assertIn('cats', map(spelled, self.solver.best_words(free_tiles)))
+        self.solver.use_dictionaries(['words', 'extra'], exclude = 'deny')
+        self.assertNotIn('cats',
+                         map(spelled, self.solver.best_words(free_tiles)))
+
+
+class Test_UpdateWords(SolverTestCase):
+    def bookworm_tiles(self, letters, status = 'normal'):
+        return [BookwormTile(letter, status, SCORES) for letter in letters]
+
+    def grid(self, tiles_):
+        grid = BookwormGrid()
+        for number, tile_ in enumerate(tiles_):
+            grid.place(tile_, number // 4, number % 4)
+        return grid
+
+    def strings_and_scores(self, words):
+        return [(spelled(word), sum(tile_.points() for tile_ in word))
+                for word in words]
+
+    def assertSameAsBestWords(self, board, new_board, list_limit = None):
+        previous_words = self.solver.best_words(board, list_limit = list_limit)
+        changes = self.grid(new_board) - self.grid(board)
+        found = self.strings_and_scores(self.solver.update_words(
+                    previous_words, new_board, changes, list_limit = list_limit))
+        expected = self.strings_and_scores(
+                       self.solver.best_words(new_board,
+                                              list_limit = list_limit))
+        #words with equal scores can be in another order (kept words come
+        #first) and a limited list can end with other words of equal score
+        self.assertEqual([score for string, score in found],
+                         [score for string, score in expected])
+        if list_limit and expected:
+            found = [word for word in found if word[1] != expected[-1][1]]
+            expected = [word for word in expected
+                        if word[1] != expected[-1][1]]
+        self.assertEqual(sorted(found), sorted(expected))
+
+    def test_lost_word_still_spelled_upper_case(self):
+        #regression: upper case words that lost a tile were dropped even
+        #when the unchanged tiles could still spell them
+        board = [BookwormTile(letter, status, SCORES) for letter, status in
+                 zip('CRSCEASCAROO', ['normal', 'ruby', 'normal', 'ruby'] +
+                                     ['normal'] * 8)]
+        replaced = {1: 'A', 2: 'T', 3: 'K', 5: 'C', 10: 'S'} #played ORCAS
+        new_board = [BookwormTile(replaced[number], 'normal', SCORES)
+                     if number in replaced else tile_
+                     for number, tile_ in enumerate(board)]
+        self.assertSameAsBestWords(board, new_board)
+
+    def test_random_played_words(self):
+        rng = random.Random(10)
+        for trial in range(40):
+            board = [BookwormTile(rng.choice('ACEKORST'),
+                                  rng.choice(['normal', 'normal', 'ruby']),
+                                  SCORES) for number in range(12)]
+            words = self.solver.best_words(board)
+            if not words: continue
+            played = rng.choice(words)
+            new_board = [tile_ if not any(tile_ is played_ for played_ in
+                                          played) else
+                         BookwormTile(rng.choice('ACEKORST'), 'normal', SCORES)
+                         for tile_ in board]
+            self.assertSameAsBestWords(board, new_board)
+            self.assertSameAsBestWords(board, new_board, list_limit = 5)
+
+
+if __name__ == "__main__":
+    try: unittest.main()
+    except SystemExit: pass
@@ -0,0 +1,190 @@
+from concurrent.futures import Future
+import os
+import shutil
+import tempfile
+import threading
+from time import perf_counter
+import unittest
+
+import autoconfig
+import anagram_solver
+import cachedir
+import wordlist
+from bookworm_utility import *
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(os.path.dirname(TEST_DIR), 'config.ini')
+WORDS = ['at', 'ta', 'eat', 'tea', 'ate', 'sea', 'set', 'cat', 'act', 'acts',
+         'cats', 'scat', 'coat', 'coats', 'tacos', 'rock', 'rocks', 'cork',
+         'stock', 'stack', 'track', 'oak', 'soak', 'toast', 'coast', 'actor',
+         'mist', 'mine', 'mines', 'time', 'times', 'item', 'items', 'smite',
+         'emit', 'emits', 'mite', 'mites', 'inset', 'stein', 'tine', 'nit']
+
+
+class UtilityTestCase(unittest.TestCase):
+    """BookwormUtility without UI or screen capture, with the tables of
+    config.ini and a small dictionary in a temporary directory."""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.words_path = os.path.join(self.directory, 'words.txt')
+        with open(self.words_path, 'w') as f:
+            f.write('\n'.join(WORDS))
+        self.utility = BookwormUtility.__new__(BookwormUtility)
+        self.utility._ac = autoconfig.AutoConfig.from_file(
+                               CONFIG_PATH, interpret_data = True)
+        ac = self.utility._ac
+        ac.override('cache', 'path', self.directory)
+        #the dictionary that config.ini uses
+        ac.override('dictionaries', '2of12inf', self.words_path)
+        self.scores = BookwormScores(
+            {option: ac.get('status multipliers', option)
+             for option in ac.options('status multipliers')},
+            {option: ac.get('letter points', option)
+             for option in ac.options('letter points')})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def solver(self):
+        return anagram_solver.AnagramSolver(
+                   min_letters = 2, registry = wordlist.DictionaryRegistry(
+                       {'words': self.words_path},
+                       cachedir.CacheDirectory(self.directory)),
+                   dictionaries = 'words')
+
+
+class Test_BookwormScores(UtilityTestCase):
+    def old_points(self, letters, status):
+        """Points as each tile worked them out before the shared table."""
+        ac = self.utility._ac
+        letter_points = {option: ac.get('letter points', option)
+                         for option in ac.options('letter points')}
+        multiplier = ac.get('status multipliers', status)
+        if letters in letter_points:
+            return letter_points[letters] * multiplier
+        return sum([letter_points[letter.lower()]
+                    for letter in letters]) * multiplier
+
+    def test_same_as_old_formula(self):
+        for status in self.utility._ac.options('status multipliers'):
+            for letters in ('A', 'x', 'Qu', 'qu', 'ST'):
+                tile = BookwormTile(letters, status, self.scores)
+                self.assertEqual(tile.points(),
+                                 self.old_points(letters, status))
+                self.assertEqual(tile.points(), tile.points()) #from table
+
+    def test_shared_by_equal_tiles(self):
+        ruby = BookwormTile('Qu', 'ruby', self.scores).points()
+        self.assertEqual(BookwormTile('Qu', 'ruby', self.scores).points(),
+                         ruby)
+        self.assertLess(BookwormTile('Qu', 'normal', self.scores).points(),
+                        ruby)
+        self.assertEqual(len(self.scores._points), 2) #one entry per kind
+
+    def test_status_change(self):
+        #Link n Spell changes the status of tiles that were used
+        tile = BookwormTile('K', 'normal', self.scores)
+        for status in ('ruby', 'used count 1', 'smashed', 'normal'):
+            tile.status = status
+            self.assertEqual(tile.points(), self.old_points('K', status))
+        tile.status = 'diamond'
+        self.assertEqual(tile.points(), 2 * self.old_points('K', 'normal'))
+
+
+class Test_LoadSolver(UtilityTestCase):
+    def test_solver_waits_for_load(self):
+        loaded = threading.Event()
+        release = threading.Event()
+        def load_solver(started):
+            release.wait(5)
+            solver = BookwormUtility._load_solver(self.utility, started)
+            loaded.set()
+            return solver
+        self.utility._load_solver = load_solver
+        self.utility._anagram = self.utility._load_solver_in_background(
+                                    perf_counter())
+        self.assertFalse(self.utility._anagram.done()) #started right away
+        threading.Timer(0.05, release.set).start()
+        solver = self.utility._solver()
+        self.assertTrue(loaded.is_set())
+        self.assertIsInstance(solver, anagram_solver.AnagramSolver)
+        self.assertIs(self.utility._solver(), solver)
+        words = solver.best_words([BookwormTile(letter, 'normal', self.scores)
+                                   for letter in 'CATS'])
+        self.assertIn('cats', map(self.utility.tiles_to_string, words))
+
+    def test_load_failure_raised_at_first_query(self):
+        self.utility._ac.override('dictionaries', '2of12inf',
+                                  os.path.join(self.directory, 'missing.txt'))
+        self.utility._anagram = self.utility._load_solver_in_background(
+                                    perf_counter())
+        with self.assertRaises(FileNotFoundError):
+            self.utility._solver()
+
+
+class Test_GetWords(UtilityTestCase):
+    def setUp(self):
+        super().setUp()
+        utility = self.utility
+        ac = utility._ac
+        utility._grids = {'main grid': utility._calc_grid_percents(
+                              *[ac.get('main grid', option) for option in
+                                ('screen_h', 'screen_w', 'grid_top',
+                                 'grid_left', 'step', 'padding', 'rows',
+                                 'columns')])}
+        utility._previous_words = {}
+        utility._executor = None
+        utility._anagram = Future()
+        utility._anagram.set_result(self.solver())
+        self.captures = []
+        utility._get_tile_grid = lambda grid_name, debug_path: \
+                                     self.captures.pop(0)
+
+    def grid(self, letters):
+        grid = BookwormGrid()
+        for number, letter in enumerate(letters):
+            grid.place(BookwormTile(letter, 'normal', self.scores),
+                       number // 4, number % 4)
+        return grid
+
+    def words(self, grid):
+        """Return the strings of the next turn for a captured grid."""
+        self.captures.append(grid)
+        return [self.utility.tiles_to_string(word) for word in
+                self.utility._get_words('main grid', num_words = 5)]
+
+    def fresh_words(self, grid):
+        tiles = [tile for tile, position in grid.nodes()]
+        return [self.utility.tiles_to_string(word) for word in
+                self.solver().best_words(tiles, unique_words = True,
+                                         list_limit = 5)]
+
+    def test_failed_capture_between_boards(self):
+        #regression: a failed capture diffed as an unchanged board, so it
+        #and the next board got the words of the board before
+        first = self.grid('CATSROCKOAKSTACK')
+        second = self.grid('MISTEMINETIMESNE')
+        self.assertEqual(self.words(first), self.fresh_words(first))
+        self.assertEqual(self.words(BookwormGrid()), []) #no tiles read
+        self.assertNotIn('main grid', self.utility._previous_words)
+        self.assertNotEqual(self.fresh_words(second), self.fresh_words(first))
+        self.assertEqual(self.words(second), self.fresh_words(second))
+
+    def test_partial_capture_is_not_remembered(self):
+        first = self.grid('CATSROCKOAKSTACK')
+        self.words(first)
+        partial = self.grid('MISTEMINE')
+        self.assertEqual(self.words(partial), self.fresh_words(partial))
+        self.assertNotIn('main grid', self.utility._previous_words)
+
+    def test_next_board_is_updated(self):
+        first = self.grid('CATSROCKOAKSTACK')
+        second = self.grid('CATSROCKOAKSTIME')
+        self.words(first)
+        self.assertEqual(self.words(second), self.fresh_words(second))
+        self.assertIs(self.utility._previous_words['main grid'][0], second)
+
+
+if __name__ == "__main__":
+    try: unittest.main()
+    except SystemExit: pass
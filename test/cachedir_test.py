@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+from cachedir import *
+
+
+class Test_CacheDirectory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = CacheDirectory(self.directory.name, keep = 2)
+        self.builds = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def build(self, contents):
+        def build(path):
+            self.builds.append(path)
+            if path:
+                with open(path, 'wb') as f:
+                    f.write(contents)
+            return contents
+        return build
+
+    def test_artifact_path(self):
+        path = self.cache.artifact_path('index', b'abc', 2, 20)
+        self.assertEqual(os.path.dirname(path), self.directory.name)
+        self.assertTrue(os.path.basename(path).startswith('index-'))
+        self.assertEqual(path, self.cache.artifact_path('index', b'abc', 2, 20))
+        self.assertNotEqual(path, self.cache.artifact_path('index', b'abc', 2))
+        self.assertNotEqual(path, self.cache.artifact_path('index', b'abd',
+                                                           2, 20))
+
+    def test_build_once(self):
+        path = self.cache.artifact_path('index', b'abc')
+        self.assertEqual(self.cache.load_or_build(path, self.load,
+                                                  self.build(b'built')),
+                         b'built')
+        self.assertEqual(self.cache.load_or_build(path, self.load,
+                                                  self.build(b'again')),
+                         b'built')
+        self.assertEqual(len(self.builds), 1)
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+    def test_failed_build_leaves_nothing(self):
+        path = self.cache.artifact_path('index', b'abc')
+        def build(path):
+            with open(path, 'wb') as f:
+                f.write(b'half')
+            raise RuntimeError('interrupted')
+        with self.assertRaises(RuntimeError):
+            self.cache.load_or_build(path, self.load, build)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+    def test_evict(self):
+        paths = [self.cache.artifact_path('index', bytes([number]))
+                 for number in range(3)]
+        for age, path in enumerate(paths):
+            self.cache.load_or_build(path, self.load, self.build(b'x'))
+            os.utime(path, (age, age)) #older files first
+        other = self.cache.artifact_path('other', b'abc')
+        self.cache.load_or_build(other, self.load, self.build(b'x'))
+        self.assertEqual([os.path.exists(path) for path in paths],
+                         [False, True, True])
+        self.assertTrue(os.path.exists(other))
+        #removing a lock file could let two processes build at once
+        self.assertTrue(os.path.exists(paths[0] + '.lock'))
+
+    def test_not_writable(self):
+        with tempfile.NamedTemporaryFile(dir = self.directory.name) as f:
+            cache = CacheDirectory(f.name) #a file, not a directory
+            path = cache.artifact_path('index', b'abc')
+            self.assertEqual(cache.load_or_build(path, self.load,
+                                                 self.build(b'memory')),
+                             b'memory')
+        self.assertEqual(self.builds, [None])
+
+
+if __name__ == "__main__":
+    try: unittest.main()
+    except SystemExit: pass
@@ -1,208 +1,190 @@
+import glob
+import os
 import unittest
 
-from image_to_data import *
+import cv2 as cv
 
+import flexframe
+import image_to_data
+from image_to_data import *
 
-class TestConstructor(unittest.TestCase):
-    def setUp(self):
-        self.td = {}
-        self.td[0] = {'source':'image_to_data_test/templates/a.jpg', 'output_data':'a'}
-        self.td[1] = {'source':'image_to_data_test/templates/d.jpg', 'output_data':'d'}
-        self.td[2] = {'source':'image_to_data_test/templates/e.jpg', 'output_data':'e'}
-        self.td[3] = {'source':'image_to_data_test/templates/k.jpg', 'output_data':'k'}
-        self.td[4] = {'source':'image_to_data_test/templates/m.jpg', 'output_data':'m'}
-        self.td[5] = {'source':'image_to_data_test/templates/n.jpg', 'output_data':'n'}
-        self.td[5] = {'source':'image_to_data_test/templates/r.jpg', 'output_data':'r'}
-        self.td[6] = {'source':'image_to_data_test/templates/t.jpg', 'output_data':'t'}
-        self.td[7] = {'source':'image_to_data_test/templates/u.jpg', 'output_data':'u'}
-        self.td[8] = {'source':'image_to_data_test/templates/w.jpg', 'output_data':'w'}
-        self.td[9] = {'source':'image_to_data_test/templates/y.jpg', 'output_data':'y'}
-
-    def test_construction(self):
-        i2d = ImageToData(self.td)
-        self.assertIn([640,480],i2d.ac.get('crop','resolutions'))
-        self.assertIn([800,600],i2d.ac.get('crop','resolutions'))
-        self.assertIn([1920,1200],i2d.ac.get('crop','resolutions'))
-        self.assertNotIn([53,53],i2d.ac.get('crop','resolutions'))
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIR = os.path.join(os.path.dirname(TEST_DIR), 'templates')
+#stored screenshots of the game, 816x638 windows with borders
+SCREENSHOTS = sorted(glob.glob(os.path.join(TEST_DIR, '*.png')))
+#screenshots of games with tiles in the main grid
+CLASSIC_SCREENSHOTS = [path for path in SCREENSHOTS
+                       if not os.path.basename(path).startswith(
+                           ('letter rip', 'linknspell', 'word master'))]
+
+
+def templates(kind):
+    """Return templates_and_data of the templates in TEMPLATES_DIR/kind
+    with the file name as data."""
+    path = os.path.join(TEMPLATES_DIR, kind)
+    return {index: {'source': os.path.join(path, name),
+                    'output_data': os.path.splitext(name)[0]}
+            for index, name in enumerate(sorted(os.listdir(path)))}
+
+
+def grid_regions(top, left, step, rows, columns, padding = 0):
+    """Return a FlexFrame of % regions of a tile grid on an 800x600 screen
+    (as in the grid sections of config.ini)."""
+    regions = flexframe.FlexFrame('row', 'col')
+    for row in range(rows):
+        for col in range(columns):
+            y, x = top + step*row, left + step*col
+            regions.place({'top': 100*(y + padding)/600,
+                           'left': 100*(x + padding)/800,
+                           'bottom': 100*(y + step)/600,
+                           'right': 100*(x + step)/800}, row, col)
+    return regions
+
+
+MAIN_GRID = grid_regions(309, 302, 50, 4, 4)
+LINK_N_SPELL_GRID = grid_regions(83, 242, 59, 5, 5, padding = 8)
+
+
+def reader(kind, method, **kwargs):
+    """Return an ImageToData with the crop settings of the utility."""
+    return ImageToData(templates(kind), method = method,
+                       crop_to_resolution = True, crop_to_4to3_aspect = True,
+                       shrink_to_height = 600, **kwargs)
+
+
+def per_cell_data(i2d, source, pcnt_regions):
+    """Return the data of each region by matching every template with
+    every region one at a time (cv.matchTemplate)."""
+    image = i2d._prepare_image(source)
+    i2d._prepare_templates()
+    data = []
+    for pcnt_region, position in pcnt_regions.nodes():
+        left, top, width, height = i2d._pcnt_region_to_ROI(image, pcnt_region)
+        roi = image[top:top+height, left:left+width]
+        sqdiffs = {}
+        for index, td in i2d._templates_and_data.items():
+            template = td['template_' + i2d.method]
+            if (template.shape[HEIGHT] > roi.shape[HEIGHT] or
+                    template.shape[WIDTH] > roi.shape[WIDTH]):
+                continue
+            sqdiffs[index] = cv.minMaxLoc(cv.matchTemplate(
+                                 roi, template, cv.TM_SQDIFF))[0]
+        data.append(i2d._templates_and_data[min(sqdiffs, key = sqdiffs.get)]
+                                           ['output_data'])
+    return data
+
+
+def frame_data(frame):
+    return [data for data, position in frame.nodes()]
+
+
+class ScreenshotTestCase(unittest.TestCase):
+    def setUp(self):
+        image_to_data._image_cache.clear()
+        self.assertTrue(CLASSIC_SCREENSHOTS)
+
+    def readers(self, **kwargs):
+        return [reader('letters', 'grayscale correlation', **kwargs),
+                reader('statuses', 'rgb correlation', **kwargs)]
+
+
+class Test_Constructor(unittest.TestCase):
+    def test_resolutions(self):
+        i2d = ImageToData(templates('statuses'))
+        self.assertIn([640,480], i2d.ac.get('crop','resolutions'))
+        self.assertIn([800,600], i2d.ac.get('crop','resolutions'))
+        self.assertIn([1920,1200], i2d.ac.get('crop','resolutions'))
+        self.assertNotIn([53,53], i2d.ac.get('crop','resolutions'))
 
     def test_custom_resolutions(self):
-        i2d = ImageToData(self.td, resolutions = [[53,53]])
-        self.assertIn([53,53],i2d.ac.get('crop','resolutions'))
-        self.assertNotIn([640,480],i2d.ac.get('crop','resolutions'))
-
-class TestGetData(unittest.TestCase):
-    def setUp(self):
-        pass
-
-    def test_function(self):
-        pass
-
-class Test_PrepareImage(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_PrepareTemplate(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_PrepareTemplates(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_Identify(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_PcntRegionToROI(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_SourceToImage(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_AdjustForRules(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_AdjustForMethod(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_ConvertToRGB(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_ConvertToGrayscale(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_ConvertToAverageColor(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_GetScreenshot(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
+        i2d = ImageToData(templates('statuses'), resolutions = [[53,53]])
+        self.assertIn([53,53], i2d.ac.get('crop','resolutions'))
+        self.assertNotIn([640,480], i2d.ac.get('crop','resolutions'))
+
+
+class Test_Identify(ScreenshotTestCase):
+    def test_batched_same_as_per_cell(self):
+        for i2d in self.readers():
+            for screenshot in SCREENSHOTS:
+                for regions in (MAIN_GRID, LINK_N_SPELL_GRID):
+                    self.assertEqual(
+                        frame_data(i2d.get_data(screenshot, regions)),
+                        per_cell_data(i2d, screenshot, regions), screenshot)
+
+    def test_pyramid_same_as_per_cell(self):
+        #the coarse pass can only miss on regions without a tile in them
+        for i2d in self.readers(coarse_levels = 1, coarse_candidates = 3):
+            for screenshot in CLASSIC_SCREENSHOTS:
+                self.assertEqual(
+                    frame_data(i2d.get_data(screenshot, MAIN_GRID)),
+                    per_cell_data(i2d, screenshot, MAIN_GRID), screenshot)
+
+
+class Test_Caches(ScreenshotTestCase):
+    def test_image_cache_hit_same_as_miss(self):
+        screenshot = SCREENSHOTS[0]
+        letters, statuses = self.readers()
+        missed = frame_data(letters.get_data(screenshot, MAIN_GRID))
+        cached = dict(image_to_data._image_cache)
+        self.assertEqual(len(cached), 2) #cropped and converted
+        #statuses share the cropped image and add their own conversion
+        statuses.get_data(screenshot, MAIN_GRID)
+        self.assertEqual(len(image_to_data._image_cache), 3)
+        #another object hits the prepared image but not the ROI cache
+        hit = frame_data(reader('letters', 'grayscale correlation')
+                         .get_data(screenshot, MAIN_GRID))
+        self.assertEqual(hit, missed)
+        for key, image in cached.items():
+            self.assertIs(image_to_data._image_cache[key], image)
+
+    def test_pixels_hit_same_as_file(self):
+        screenshot = SCREENSHOTS[1]
+        letters = self.readers()[0]
+        from_file = frame_data(letters.get_data(screenshot, MAIN_GRID))
+        image = cv.imread(screenshot)
+        self.assertEqual(frame_data(letters.get_data(image, MAIN_GRID)),
+                         from_file)
+        #an equal copy of the pixels is the same cached image
+        cached = len(image_to_data._image_cache)
+        self.assertEqual(frame_data(letters.get_data(image.copy(),
+                                                     MAIN_GRID)),
+                         from_file)
+        self.assertEqual(len(image_to_data._image_cache), cached)
+
+    def test_roi_cache_hit_same_as_miss(self):
+        letters = self.readers()[0]
+        missed = [frame_data(letters.get_data(screenshot, MAIN_GRID))
+                  for screenshot in SCREENSHOTS[:3]]
+        cached = dict(letters._roi_cache)
+        image_to_data._image_cache.clear()
+        hit = [frame_data(letters.get_data(screenshot, MAIN_GRID))
+               for screenshot in SCREENSHOTS[:3]]
+        self.assertEqual(hit, missed)
+        self.assertEqual(letters._roi_cache, cached) #nothing new
+
+    def test_changed_settings_miss(self):
+        letters = self.readers()[0]
+        letters.get_data(SCREENSHOTS[0], MAIN_GRID)
+        letters.coarse_levels = 1
+        roi_count = len(letters._roi_cache)
+        letters.get_data(SCREENSHOTS[0], MAIN_GRID)
+        self.assertEqual(len(letters._roi_cache), 2 * roi_count)
+
+
+class Test_MultiImageToData(ScreenshotTestCase):
+    def test_same_as_each_head(self):
+        letters, statuses = self.readers()
+        multi = MultiImageToData({'letters': letters, 'status': statuses})
+        for screenshot in SCREENSHOTS[:4]:
+            tiles = multi.get_data(cv.imread(screenshot), MAIN_GRID,
+                                   combine = lambda **data: data)
+            self.assertEqual(
+                frame_data(tiles),
+                [{'letters': letter, 'status': status} for letter, status in
+                 zip(frame_data(letters.get_data(screenshot, MAIN_GRID)),
+                     frame_data(statuses.get_data(screenshot, MAIN_GRID)))])
 
-class Test_ConvertToRGB(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_CropToResolution(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_CropTo4To3Aspect(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-class Test_ShrinkToHeight(unittest.TestCase):
-    def setUp(self):
-
-    def test_function(self):
-
-
-        
 
 if __name__ == "__main__":
     try: unittest.main()
     except SystemExit: pass
-
-##
-##    ''' Create Templates and data for testing '''
-
-##
-##    ''' Create Regions for all letter tiles '''
-##    letter_regions = {}
-##    height = 600
-##    width = 800
-##    tiles_top = 309
-##    tiles_left = 302
-##    step = 50
-##    letter_regions = flexframe.FlexFrame('y', 'x')
-##    for y in range(tiles_top, tiles_top + step*3 + 1, step):
-##        for x in range(tiles_left, tiles_left + step*3 + 1, step):
-##            letter_region = {'top':100*y/height,
-##                             'left':100*x/width,
-##                             'bottom':100*(y+step)/height,
-##                             'right':100*(x+step)/width}
-##            letter_regions.place(letter_region, y, x)
-##
-##    itd = ImageToData(templates_and_data = td)
-##
-##
-##    print('Test grayscale letter matching ********************************')
-##    indexed_letters = itd.get_data('image_to_data_test/stun.jpg',
-##                                   method = 'grayscale correlation',
-##                                   pcnt_regions = letter_regions,
-##                                   crop_to_resolution = True,
-##                                   crop_to_4to3_aspect = True,
-##                                   shrink_to_height = 480)
-##    print('stun.jpg: ', indexed_letters)
-
-##    print('Test rgb letter matching ********************************')
-##    letters = itd.get_data('image_to_data_test/stun.jpg',
-##                           method = 'rgb correlation',
-##                           regions = letter_regions,
-##                           crop_to_resolution = True,
-##                           crop_to_4to3_aspect = True,
-##                           shrink_to_height = 480)
-##    print(letters)
-
-##    print('Test image loading and processing ****************')
-##    ''' create list of all source types '''
-##    sources = []
-##    sources.append('image_to_data_test/sample_for_load_borders.bmp') #image_to_data_test path
-##    sources.append(cvLoadImage('image_to_data_test/stun.jpg')) #image_to_data_test image
-##    sources.append('image_to_data') #image_to_data_test title
-##    ''' create list of all method types '''
-##    methods = []
-##    methods.append('rgb correlation')
-##    methods.append('grayscale correlation')
-##    methods.append('average color')
-##    ''' create list of values for each rule '''
-##    crop_to_resolution_values = []
-##    crop_to_4to3_aspect_values = []
-##    shrink_to_height_values = []
-##    crop_to_resolution_values.append(False)
-##    crop_to_resolution_values.append(True)
-##    crop_to_4to3_aspect_values.append(False)
-##    crop_to_4to3_aspect_values.append(True)
-##    shrink_to_height_values.append(None)
-##    shrink_to_height_values.append(320)
-##    ''' image_to_data_test all combinations of values '''
-##    for source in sources:
-##        for method in methods:
-##            for crop_to_resolution in crop_to_resolution_values:
-##                for crop_to_4to3_aspect in crop_to_4to3_aspect_values:
-##                    for shrink_to_height in shrink_to_height_values:
-##                        title = 'iplimage' if isinstance(source, IplImage) else os.path.split(source)[1]
-##                        title += ' ** ' + method
-##                        title += ' ** crop_res ' + str(crop_to_resolution)
-##                        title += ' ** crop_aspect ' + str(crop_to_4to3_aspect)
-##                        title += ' ** shrink_to ' + str(shrink_to_height)
-##                        image = itd._prepare_image(source, method,
-##                                                   crop_to_resolution,
-##                                                   crop_to_4to3_aspect,
-##                                                   shrink_to_height)
-##                        print('_prepare_image Test: ' + title)
-##                        _debug_display(image, title)
-##                        key = input('enter to continue q to quit')
-##                        if key in ('q','Q'):
-##                            return
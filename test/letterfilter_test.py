@@ -0,0 +1,71 @@
+import unittest
+
+from letterfilter import *
+
+
+class Test_LetterFilter(unittest.TestCase):
+    def setUp(self):
+        self.words = ['a', 'at', 'ate', 'tea', 'teas', 'tease', 'quit']
+        self.letter_filter = LetterFilter(self.words)
+
+    def test_len(self):
+        self.assertEqual(len(self.letter_filter), len(self.words))
+
+    def test_sub_multiset(self):
+        self.assertEqual(self.letter_filter.feasible_words('etas'),
+                         ['a', 'at', 'ate', 'tea', 'teas'])
+        #one more e allows tease. case and non-letters are ignored
+        self.assertEqual(self.letter_filter.feasible_words('E-E-T-A-S'),
+                         ['a', 'at', 'ate', 'tea', 'teas', 'tease'])
+        #multi-letter tiles just contribute all of their letters
+        self.assertEqual(self.letter_filter.feasible_words('Quit'), ['quit'])
+        self.assertEqual(self.letter_filter.feasible_words(''), [])
+
+    def test_required(self):
+        self.assertEqual(self.letter_filter.feasible_words('eetas',
+                                                           required = 'se'),
+                         ['teas', 'tease'])
+
+    def test_any_of(self):
+        self.assertEqual(self.letter_filter.feasible_words('eetas',
+                                                           any_of = 'sx'),
+                         ['teas', 'tease'])
+        self.assertEqual(self.letter_filter.feasible_words('etas',
+                                                           any_of = ''), [])
+
+    def test_not_within(self):
+        #words that need more than 'at' has: the second t or any e or s
+        self.assertEqual(self.letter_filter.feasible_words('eetas',
+                                                           not_within = 'at'),
+                         ['ate', 'tea', 'teas', 'tease'])
+
+    def test_limit(self):
+        self.assertIsNone(self.letter_filter.feasible_words('etas', limit = 4))
+        self.assertEqual(len(self.letter_filter.feasible_words('etas',
+                                                               limit = 5)), 5)
+
+    def test_invalid_words(self):
+        with self.assertRaises(ValueError):
+            LetterFilter(['ab-c'])
+
+
+class Test_CombinedFilter(unittest.TestCase):
+    def setUp(self):
+        self.filters = [LetterFilter(['at', 'ate', 'tea']),
+                        LetterFilter(['tea', 'teas', 'eat'])]
+        self.deny = LetterFilter(['ate', 'eat'])
+
+    def test_union(self):
+        combined = CombinedFilter(self.filters, excluded = [self.deny])
+        self.assertEqual(combined.feasible_words('etas'), ['at', 'tea', 'teas'])
+        self.assertIsNone(combined.feasible_words('etas', limit = 2))
+
+    def test_intersection(self):
+        combined = CombinedFilter(self.filters, 'intersection')
+        self.assertEqual(combined.feasible_words('etas'), ['tea'])
+        self.assertEqual(combined.feasible_words('eta', required = 's'), [])
+
+
+if __name__ == "__main__":
+    try: unittest.main()
+    except SystemExit: pass
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from multiprocessing import shared_memory
+
+import cv2 as cv
+import numpy as np
+
+from screen_capture import *
+
+
+class Test_WindowCapture(unittest.TestCase):
+    def grab(self, frames):
+        frames = iter(frames)
+        def grab():
+            self.grabs += 1
+            return next(frames)
+        self.grabs = 0
+        return grab
+
+    def test_adaptive_settle_stops_when_unchanged(self):
+        capture = WindowCapture(settle = 10, poll = 0)
+        frames = [np.zeros(2), np.ones(2), np.ones(2), np.ones(2),
+                  np.zeros(2)]
+        self.assertTrue(np.array_equal(capture._settled(self.grab(frames)),
+                                       np.ones(2)))
+        self.assertEqual(self.grabs, 4)
+
+    def test_adaptive_settle_waits_out_pauses(self):
+        #one unchanged pair between two redraws doesn't end the wait
+        capture = WindowCapture(settle = 10, poll = 0)
+        frames = [np.zeros(2), np.zeros(2), np.ones(2), np.full(2, 2),
+                  np.full(2, 2), np.full(2, 2), np.zeros(2)]
+        self.assertTrue(np.array_equal(capture._settled(self.grab(frames)),
+                                       np.full(2, 2)))
+        self.assertEqual(self.grabs, 6)
+
+    def test_adaptive_settle_deadline(self):
+        capture = WindowCapture(settle = 0, poll = 0)
+        frames = [np.zeros(2), np.ones(2)]
+        self.assertTrue(np.array_equal(capture._settled(self.grab(frames)),
+                                       np.zeros(2)))
+        self.assertEqual(self.grabs, 1)
+
+    def test_fixed_settle(self):
+        capture = WindowCapture(settle = 0, adaptive = False)
+        frames = [np.zeros(2), np.ones(2)]
+        self.assertTrue(np.array_equal(capture._settled(self.grab(frames)),
+                                       np.zeros(2)))
+        self.assertEqual(self.grabs, 1)
+
+
+class Test_FileCapture(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.frames = [np.full((4, 6, 3), value, np.uint8)
+                       for value in (10, 20)]
+        for number, frame in enumerate(self.frames):
+            cv.imwrite(os.path.join(self.directory.name,
+                                    'frame{}.png'.format(number)), frame)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_directory_frames_in_order(self):
+        capture = FileCapture(self.directory.name)
+        for expected in self.frames + self.frames[-1:]: #then the last again
+            self.assertTrue(np.array_equal(capture.capture('title'), expected))
+
+    def test_file(self):
+        capture = FileCapture(os.path.join(self.directory.name, 'frame1.png'))
+        self.assertTrue(np.array_equal(capture.capture(), self.frames[1]))
+
+    def test_no_frames(self):
+        with tempfile.TemporaryDirectory() as empty:
+            with self.assertRaises(RuntimeError):
+                FileCapture(empty).capture()
+
+
+class Test_SharedMemoryCapture(unittest.TestCase):
+    def setUp(self):
+        self.memory = shared_memory.SharedMemory(create = True, size = 4*6*3)
+
+    def tearDown(self):
+        self.memory.close()
+        self.memory.unlink()
+
+    def test_capture_copies_frame(self):
+        written = np.ndarray((4, 6, 3), np.uint8, self.memory.buf)
+        written[:] = 7
+        capture = SharedMemoryCapture(self.memory.name, height = 4, width = 6)
+        frame = capture.capture()
+        written[:] = 8 #the next frame doesn't change the captured one
+        self.assertTrue(np.array_equal(frame, np.full((4, 6, 3), 7)))
+        self.assertTrue(np.array_equal(capture.capture(),
+                                       np.full((4, 6, 3), 8)))
+        del written
+        capture.close()
+
+    def test_too_small(self):
+        with self.assertRaises(ValueError):
+            SharedMemoryCapture(self.memory.name, height = 5, width = 6)
+
+
+if __name__ == "__main__":
+    try: unittest.main()
+    except SystemExit: pass
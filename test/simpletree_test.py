@@ -177,6 +177,34 @@ class Test_Tree(unittest.TestCase):
         leaf_names = [leaf['name'] for leaf in self.root.leaves()]
         self.assertEqual(leaf_names, self.byhand_leaf_names)
 
+    def test_route_to_from_ancestor(self):
+        self.assertEqual(list(self.L2_node.route_to_ancestor(self.L1_node)),
+                         [self.L2_node, self.L1_node])
+        self.assertEqual(list(self.L2_node.route_from_ancestor(self.root)),
+                         list(reversed(self.byhand_L2_route)))
+        with self.assertRaises(ValueError):
+            list(self.L1_node.route_from_ancestor(self.L2_node))
+
+    def test_trim_during_traverse_post_order(self):
+        #each node can be trimmed as soon as it is generated
+        for node in self.root.traverse_post_order():
+            node.trim()
+        self.assertEqual(list(self.root.children()), [])
+
+    def test_prune_where(self):
+        #prune every branch that does not lead to a node named 'keep'
+        keep = TreeNode(name='keep')
+        self.L2_node.graft(TreeNode(name='dead'))
+        list(self.L1_node.children())[1].graft(keep)
+        trimmed = self.root.prune_where(lambda node: node['name'] != 'keep')
+        self.assertEqual([node['name'] for node in trimmed],
+                         ['root,2,0', 'root,2,2', 'root,0', 'root,1'])
+        self.assertEqual([node['name'] for node in self.root.traverse()],
+                         ['root', 'root,2', 'root,2,1', 'keep'])
+        #nothing left to prune and root is never trimmed
+        self.assertEqual(keep.prune_where(lambda node: True), [])
+        self.assertEqual(self.root.prune_where(lambda node: False), [])
+
     def test_trim(self):
         self.L1_node.trim()
         traversal_names = [node['name'] for node in self.root.traverse()]
@@ -252,7 +280,127 @@ class Test_Tree(unittest.TestCase):
         byhand_traversal_names = ['root',
                                   'root,0','root,1','root,2']
         self.assertEqual(traversal_names, byhand_traversal_names)
-    
+
+
+class Test_CompactTree(unittest.TestCase):
+    def setUp(self):
+        self.Node = CompactTreeNode.with_fields('name', 'letter')
+        #same 3 level tree as Test_Tree
+        self.root = self.Node(name='root')
+        for i in range(3):
+            node = self.Node()
+            self.root.graft(node)
+            node['name'] = node.parent()['name'] + ',' + str(i)
+            self.L1_node = node
+        for i in range(3):
+            node = self.Node()
+            self.L1_node.graft(node)
+            node['name'] = node.parent()['name'] + ',' + str(i)
+            self.L2_node = node
+        self.byhand_traversal_names = ['root',
+                                       'root,0','root,1','root,2',
+                                       'root,2,0','root,2,1','root,2,2']
+
+    def test_fields(self):
+        node = self.Node(data_ = {'letter':'a'}, name='n')
+        self.assertEqual(node['letter'], 'a')
+        self.assertEqual(node.data, {'name':'n', 'letter':'a'})
+        #unset and unknown fields both raise KeyError like a missing dict key
+        self.assertEqual(self.Node(name='n').data, {'name':'n'})
+        with self.assertRaises(KeyError):
+            self.Node(name='n')['letter']
+        with self.assertRaises(KeyError):
+            node['other'] = 1
+        with self.assertRaises(AttributeError):
+            node.other = 1 #no per node attribute dict
+
+    def test_children(self):
+        self.assertIsInstance(self.root.children(), tuple)
+        self.assertEqual(self.L1_node.children()[2], self.L2_node)
+        self.assertEqual(self.L2_node.children(), ())
+
+    def test_depth(self):
+        self.assertEqual(self.root.depth(), 0)
+        self.assertEqual(self.L1_node.depth(), 1)
+        self.assertEqual(self.L2_node.depth(), 2)
+        #depths of a whole branch follow trim and graft
+        self.L1_node.trim()
+        self.assertEqual(self.L2_node.depth(), 1)
+        branch = self.Node(name='branch')
+        self.root.graft(branch)
+        branch.graft(self.L1_node)
+        self.assertEqual(self.L1_node.depth(), 2)
+        self.assertEqual(self.L2_node.depth(), 3)
+
+    def test_traversal(self):
+        traversal_names = [node['name'] for node in self.root.traverse()]
+        self.assertEqual(traversal_names, self.byhand_traversal_names)
+        self.assertEqual([leaf['name'] for leaf in self.root.leaves()],
+                         ['root,0','root,1','root,2,0','root,2,1','root,2,2'])
+        self.assertEqual(list(self.L2_node.route_from_root()),
+                         [self.root, self.L1_node, self.L2_node])
+        self.assertEqual(list(self.root.search({'name':'root,2,1'})),
+                         [self.L1_node.children()[1]])
+        self.assertEqual(list(self.root.children_by_data('name','root,2')),
+                         [self.L1_node])
+
+    def test_trim(self):
+        self.L1_node.trim()
+        self.assertIsNone(self.L1_node.parent())
+        traversal_names = [node['name'] for node in self.root.traverse()]
+        self.assertEqual(traversal_names, ['root','root,0','root,1'])
+        with self.assertRaises(ValueError):
+            self.L2_node._parent = self.root #broken link
+            self.L2_node.trim()
+
+    def test_prune_where(self):
+        self.assertEqual(len(self.root.prune_where(lambda node: True)), 3)
+        self.assertEqual(self.root.children(), ())
+        self.assertEqual(self.L2_node.depth(), 1)
+
+    def test_trim_dead_branch(self):
+        node = self.Node(name='graft1')
+        self.L2_node.graft(node)
+        dead_root = node.trim_dead_branch()
+        self.assertEqual(dead_root, self.L2_node)
+        self.assertEqual(len(self.L1_node.children()), 2)
+
+
+class Test_IndexedTree(unittest.TestCase):
+    node_classes = (TreeNode.indexed_by('letter'),
+                    CompactTreeNode.with_fields('letter', 'word')
+                                   .indexed_by('letter'))
+
+    def test_children_by_data(self):
+        for Node in self.node_classes:
+            root = Node()
+            a1, b, a2, blank = Node(letter='a'), Node(letter='b'), \
+                               Node(letter='a'), Node()
+            for child in (a1, b, a2, blank): root.graft(child)
+            self.assertEqual(list(root.children_by_data('letter', 'a')),
+                             [a1, a2])
+            self.assertEqual(list(root.children_by_data('letter', 'z')), [])
+            self.assertEqual(list(root.children_by_data('letter', ['a'])), [])
+            #other keys are still found by scanning the children
+            b['word'] = 'b'
+            self.assertEqual(list(root.children_by_data('word', 'b')), [b])
+
+    def test_index_follows_changes(self):
+        for Node in self.node_classes:
+            root = Node()
+            a, b = Node(letter='a'), Node(letter='b')
+            root.graft(a)
+            root.graft(b)
+            a.trim()
+            self.assertEqual(list(root.children_by_data('letter', 'a')), [])
+            b['letter'] = 'c'
+            self.assertEqual(list(root.children_by_data('letter', 'b')), [])
+            self.assertEqual(list(root.children_by_data('letter', 'c')), [b])
+            root.graft(a)
+            self.assertEqual(root.trim_children(), [b, a])
+            self.assertEqual(root._index, {})
+
+
 if __name__ == "__main__":
     try: unittest.main()
     except SystemExit: pass
@@ -0,0 +1,51 @@
+import pickle
+import unittest
+
+from tile import *
+
+
+class Test_TileKind(unittest.TestCase):
+    def test_interned(self):
+        self.assertIs(TileKind.get('a', 'normal'), TileKind.get('a', 'normal'))
+        self.assertIsNot(TileKind.get('a', 'normal'), TileKind.get('a', 'ruby'))
+        self.assertNotEqual(TileKind.get('a', 'normal').number,
+                            TileKind.get('b', 'normal').number)
+
+    def test_pickle(self):
+        kind = TileKind.get('qu', 'ruby')
+        self.assertIs(pickle.loads(pickle.dumps(kind)), kind)
+
+
+class Test_KindTile(unittest.TestCase):
+    def test_attributes(self):
+        tile = KindTile('a', 'normal')
+        self.assertEqual(tile.letters, 'a')
+        self.assertEqual(tile.status, 'normal')
+        self.assertIs(tile.kind, TileKind.get('a', 'normal'))
+        with self.assertRaises(AttributeError):
+            tile.other = 1 #no per tile attribute dict
+
+    def test_change_kind(self):
+        tile = KindTile('a', 'normal')
+        tile.status = 'ruby'
+        self.assertIs(tile.kind, TileKind.get('a', 'ruby'))
+        tile.letters = 'qu'
+        self.assertEqual(tile, KindTile('qu', 'ruby'))
+
+    def test_equality_and_hash(self):
+        self.assertEqual(KindTile('a', 'normal'), KindTile('a', 'normal'))
+        self.assertNotEqual(KindTile('a', 'normal'), KindTile('a', 'ruby'))
+        self.assertEqual(hash(KindTile('a', 'normal')),
+                         hash(KindTile('a', 'normal')))
+        self.assertEqual(len({KindTile('a', 'normal'), KindTile('a', 'normal'),
+                              KindTile('b', 'normal')}), 2)
+        #tiles of other types are compared by letters and status
+        self.assertEqual(KindTile('a', 'normal'),
+                         Tile(letters = 'a', status = 'normal'))
+        self.assertNotEqual(KindTile('a', 'normal'), Tile(letters = 'a'))
+        self.assertNotEqual(KindTile('a', 'normal'), 'a')
+
+
+if __name__ == "__main__":
+    try: unittest.main()
+    except SystemExit: pass
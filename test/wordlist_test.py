@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cachedir
+from wordlist import *
+
+
+class Test_WordIndex(unittest.TestCase):
+    def setUp(self):
+        self.lines = ['ab', 'abc%', 'b', 'bcd', 'cd%', 'cdef']
+        self.checksum = bytes(32)
+        self.words = WordList.__new__(WordList) #skip the real dictionary
+        self.words._read_index(WordList._build_index(self.lines,
+                                                     self.checksum),
+                               self.checksum)
+
+    def test_filter_by_length(self):
+        #shortest first, then in dictionary order
+        self.assertEqual(list(self.words),
+                         ['b', 'ab', 'cd', 'abc', 'bcd', 'cdef'])
+        self.assertEqual(list(self.words.filter_by(2, 3)),
+                         ['ab', 'cd', 'abc', 'bcd'])
+        self.assertEqual(list(self.words.filter_by(min_length = 4)), ['cdef'])
+        self.assertEqual(list(self.words.filter_by(5)), [])
+
+    def test_filter_plural_uncountables(self):
+        self.assertEqual(list(self.words.filter_by(
+                             plural_uncountables = False)),
+                         ['b', 'ab', 'bcd', 'cdef'])
+
+    def test_only_letters(self):
+        lines = ['Café', "don't", 'ABC%', '', 'x-ray', 'naïve']
+        words = WordList.__new__(WordList)
+        words._read_index(WordList._build_index(lines, self.checksum),
+                          self.checksum)
+        self.assertEqual(list(words), ['abc', 'cafe', 'naive'])
+        self.assertEqual(list(words.filter_by(plural_uncountables = False)),
+                         ['cafe', 'naive'])
+
+    def test_stale_index(self):
+        index = WordList._build_index(self.lines, self.checksum)
+        with self.assertRaises(ValueError):
+            self.words._read_index(index, b'\x01' * 32)
+        with self.assertRaises(ValueError):
+            self.words._read_index(index[:-2], self.checksum)
+
+
+class Test_WordList(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = cachedir.CacheDirectory(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_matches_dictionary(self):
+        words = WordList(cache = self.cache) #builds the index
+        five = list(words.filter_by(5, 5, plural_uncountables = False))
+        self.assertTrue(five)
+        self.assertTrue(all(len(word) == 5 for word in five))
+        #loaded from the index this time
+        self.assertEqual(len(set(words)),
+                         len(set(WordList(cache = self.cache))))
+
+
+class Test_DictionaryRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        paths = {}
+        for name, lines in (('small', ['tea', 'ate', 'ate%', 'seas']),
+                            ('other', ['sea', 'tea', 'seas']),
+                            ('deny', ['seas'])):
+            paths[name] = os.path.join(self.directory.name, name + '.txt')
+            with open(paths[name], 'w') as f:
+                f.write('\n'.join(lines))
+        self.registry = DictionaryRegistry(
+                            paths, cachedir.CacheDirectory(self.directory.name))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_word_list(self):
+        self.assertEqual(self.registry.names(), ['small', 'other', 'deny'])
+        self.assertIs(self.registry.word_list('small'),
+                      self.registry.word_list('small'))
+        with self.assertRaises(ValueError):
+            self.registry.word_list('missing')
+
+    def test_selection(self):
+        self.assertEqual(self.registry.selection('small'),
+                         (('small',), 'union', ()))
+        self.assertEqual(self.registry.selection(['small', 'other'],
+                                                 'intersection', 'deny'),
+                         (('small', 'other'), 'intersection', ('deny',)))
+        with self.assertRaises(ValueError):
+            self.registry.selection(['small'], 'difference')
+        with self.assertRaises(ValueError):
+            self.registry.selection([])
+
+    def test_checksum(self):
+        checksum = self.registry.checksum(['small', 'other'])
+        self.assertEqual(checksum, self.registry.checksum(['other', 'small']))
+        self.assertNotEqual(checksum, self.registry.checksum(['small',
+                                                             'other'],
+                                                            'intersection'))
+        self.assertNotEqual(checksum, self.registry.checksum(['small'],
+                                                            exclude = 'other'))
+
+
+if __name__ == "__main__":
+    try: unittest.main()
+    except SystemExit: pass
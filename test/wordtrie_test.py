@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+
+from wordtrie import *
+
+
+class Test_WordTrie(unittest.TestCase):
+    def setUp(self):
+        self.words = ['a', 'at', 'ate', 'tea', 'teas', 'quit']
+        self.trie = WordTrie.from_words(self.words)
+
+    def test_len(self):
+        self.assertEqual(len(self.trie), len(self.words))
+        #duplicate words are only counted once
+        trie = WordTrie.from_words(self.words + ['tea'])
+        self.assertEqual(len(trie), len(self.words))
+
+    def test_contains(self):
+        for word in self.words:
+            self.assertIn(word, self.trie)
+        for word in ['', 't', 'te', 'teass', 'b', 'qu']:
+            self.assertNotIn(word, self.trie)
+
+    def test_iter(self):
+        self.assertEqual(list(self.trie), sorted(self.words))
+
+    def test_child(self):
+        t = self.trie.child(self.trie.ROOT, 't')
+        self.assertTrue(t)
+        self.assertFalse(self.trie.is_word(t))
+        self.assertFalse(self.trie.child(self.trie.ROOT, 'b'))
+        self.assertFalse(self.trie.child(self.trie.ROOT, '%'))
+
+    def test_walk(self):
+        #multi-letter and upper case steps as used by tiles like "Qu"
+        qu = self.trie.walk(self.trie.ROOT, 'Qu')
+        self.assertEqual(qu, self.trie.walk(self.trie.ROOT, 'qu'))
+        self.assertTrue(self.trie.is_word(self.trie.walk(qu, 'IT')))
+        #an empty step stays in place and a dead step stays dead
+        self.assertEqual(self.trie.walk(qu, ''), qu)
+        self.assertFalse(self.trie.walk(qu, 'x'))
+        self.assertFalse(self.trie.walk(0, 'a'))
+
+    def test_height(self):
+        self.assertEqual(self.trie.height(self.trie.ROOT), 4)
+        self.assertEqual(self.trie.height(self.trie.walk(self.trie.ROOT,
+                                                         'te')), 2)
+        self.assertEqual(self.trie.height(self.trie.walk(self.trie.ROOT,
+                                                         'teas')), 0)
+        dawg = WordTrie.from_words(self.words, minimize = True)
+        self.assertEqual(dawg.height(dawg.walk(dawg.ROOT, 'te')), 2)
+
+    def test_minimized(self):
+        words = self.words + ['ates', 'tease', 'quits']
+        trie = WordTrie.from_words(words)
+        dawg = WordTrie.from_words(words, minimize = True)
+        self.assertLess(dawg.node_count(), trie.node_count())
+        self.assertEqual(list(dawg), list(trie))
+        self.assertEqual(len(dawg), len(trie))
+        for word in ['', 'te', 'ts', 'teases', 'quite']:
+            self.assertNotIn(word, dawg)
+        #shared ending: "ates" and "quits" both end on the same leaf node
+        self.assertEqual(dawg.walk(dawg.ROOT, 'ates'),
+                         dawg.walk(dawg.ROOT, 'quits'))
+        self.assertEqual(dawg.walk(dawg.ROOT, 'ate'),
+                         dawg.walk(dawg.ROOT, 'quit'))
+
+    def test_save_load(self):
+        source_hash = bytes(range(32))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.bin')
+            self.trie.save(path, source_hash, 2, 20)
+            loaded = WordTrie.load(path, source_hash, 2, 20)
+            self.assertEqual(list(loaded), list(self.trie))
+            self.assertEqual(len(loaded), len(self.trie))
+            self.assertEqual(loaded.node_count(), self.trie.node_count())
+            self.assertIn('teas', loaded)
+            self.assertEqual(loaded.height(loaded.ROOT), 4)
+            del loaded #release the map before modifying the file
+            #different dictionary or filters are detected as stale
+            with self.assertRaises(ValueError):
+                WordTrie.load(path, bytes(32), 2, 20)
+            with self.assertRaises(ValueError):
+                WordTrie.load(path, source_hash, 2, None)
+            #truncated files are detected
+            with open(path, 'r+b') as f:
+                f.truncate(40)
+            with self.assertRaises(ValueError):
+                WordTrie.load(path, source_hash, 2, 20)
+
+    def test_invalid_letter(self):
+        with self.assertRaises(ValueError):
+            WordTrie.from_words(['ab-c'])
+
+
+class Test_CombinedTrie(unittest.TestCase):
+    def setUp(self):
+        self.tries = [WordTrie.from_words(['at', 'ate', 'tea']),
+                      WordTrie.from_words(['tea', 'teas', 'eat'],
+                                          minimize = True)]
+        self.deny = WordTrie.from_words(['ate', 'eat'])
+
+    def test_union(self):
+        combined = CombinedTrie(self.tries, excluded = [self.deny])
+        for word in ['at', 'tea', 'teas']:
+            self.assertIn(word, combined)
+        for word in ['ate', 'eat', 'a', 'te', 'teass']:
+            self.assertNotIn(word, combined)
+        self.assertFalse(combined.walk(combined.ROOT, 'x'))
+        self.assertEqual(combined.height(combined.walk(combined.ROOT, 'te')),
+                         2)
+
+    def test_intersection(self):
+        combined = CombinedTrie(self.tries, 'intersection')
+        self.assertIn('tea', combined)
+        self.assertNotIn('teas', combined)
+        self.assertFalse(combined.walk(combined.ROOT, 'at'))
+        self.assertEqual(combined.height(combined.walk(combined.ROOT, 'te')),
+                         1)
+
+
+if __name__ == "__main__":
+    try: unittest.main()
+    except SystemExit: pass
@@ -68,3 +68,118 @@ class Tile:
     def __hash__(self):
         return hash(self._key())
         
+
+
+class TileKind:
+    """Interned, immutable combination of letters and status.
+
+    There is only one TileKind for each combination in a process, numbered
+    in order of creation, so kinds are compared by number and hashed with
+    a hash computed once. Unpickling looks the combination up again, so
+    kinds sent to another process get that process's number.
+
+    public methods:
+    get() -- class method returning the kind for letters and status
+
+    instance variables:
+    letters, status -- the combination
+    number -- integer unique to the combination within this process
+
+    """
+    __slots__ = ('letters', 'status', 'number', '_hash')
+    _kinds = {} #(letters, status): kind
+
+    @classmethod
+    def get(cls, letters, status):
+        """Return the one kind for letters and status, creating it once."""
+        try: return cls._kinds[letters, status]
+        except KeyError: pass
+        kind = object.__new__(cls)
+        kind.letters = letters
+        kind.status = status
+        kind.number = len(cls._kinds)
+        kind._hash = hash((letters, status))
+        cls._kinds[letters, status] = kind
+        return kind
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        return (TileKind.get, (self.letters, self.status))
+
+    def __repr__(self):
+        return 'TileKind({!r}, {!r})'.format(self.letters, self.status)
+
+
+class KindTile:
+    """Compact tile with exactly the attributes letters and status.
+
+    Same interface as Tile(letters = ..., status = ...) but the attributes
+    live in a shared TileKind, so a tile is one slot and equality and
+    hashing are integer operations. Assigning letters or status switches
+    the tile to the matching kind.
+
+    public methods:
+    points()
+
+    implemented operators:
+    __eq__
+    __ne__
+    __hash__
+    __repr__
+
+    instance variables:
+    letters, status -- properties backed by the tile kind
+    kind -- the TileKind of the tile
+
+    """
+    __slots__ = ('kind',)
+    _attributes = ('letters', 'status') #same meaning as in Tile
+
+    def __init__(self, letters, status):
+        self.kind = TileKind.get(letters, status)
+
+    @property
+    def letters(self):
+        return self.kind.letters
+
+    @letters.setter
+    def letters(self, letters):
+        self.kind = TileKind.get(letters, self.kind.status)
+
+    @property
+    def status(self):
+        return self.kind.status
+
+    @status.setter
+    def status(self, status):
+        self.kind = TileKind.get(self.kind.letters, status)
+
+    def points(self):
+        """Return 1 by default. Override can calculate points dynamically."""
+        return 1
+
+    def __eq__(self, other):
+        """Compare kinds, or letters and status for other types of tiles."""
+        try: return self.kind.number == other.kind.number
+        except AttributeError: pass
+        try:
+            return (self.kind.letters == other.letters and
+                    self.kind.status == other.status)
+        except AttributeError: return False
+
+    def __ne__(self, other):
+        """Negate __eq__."""
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        """Provide readable string representing the tile."""
+        return ''.join(['letters: ', self.letters, 'status: ', self.status])
+
+    def _key(self):
+        """ create a hashable key of this tile. """
+        return (self.kind.letters, self.kind.status)
+
+    def __hash__(self):
+        return self.kind._hash
@@ -1,16 +1,61 @@
+from array import array
+import hashlib
+from itertools import accumulate
+import mmap
+import os
+import re
+import struct
+import sys
+import unicodedata
+
+import cachedir
+
 #attribute 12dicts appropriately
 
-#make dictionary loading choice
+# name of the dictionary used when none is chosen and its default path
+# (relative to this module, like any relative dictionary path)
+DEFAULT_DICTIONARY = '2of12inf'
+_DEFAULT_PATH = os.path.join('dictionaries', '2of12inf.txt')
+# on-disk word index: header, little-endian int32 word count per length,
+# the words of each length concatenated (shortest first) and a bitset with
+# one bit per word marking plural uncountables (% in 12dicts).
+# bump FORMAT_VERSION whenever the layout changes so old files are rebuilt
+FORMAT_VERSION = 2
+_MAGIC = b'BWWORDS\0'
+#magic, version, source hash, words, longest word
+_HEADER = struct.Struct('<8sI32sII')
+_UNCOUNTABLE_MARK = '%'
+# tiles only have the letters a-z. other words are left out of the index
+_WORD = re.compile('[a-z]+')
 
 
 class WordList:
     '''
     Provides subsets of words from an internal dictionary of words
     Internal Dictionary based on 12dicts
+
+    Words are kept in a memory mapped index in the cache directory,
+    bucketed by length, so filtering by length only touches the requested
+    buckets. Each version of each dictionary file gets its own index.
+    Words are lower cased and accents are removed (café is cafe). Words
+    with anything else than letters (e.g. don't) can't be made of tiles
+    and are left out.
     '''
 
-    def __init__(self):
-        self._words = self._load_words()
+    def __init__(self, path = None, cache = None):
+        '''
+        path -- dictionary file with one word per line (12dicts format).
+            Relative paths are relative to this module. Default: 2of12inf
+        cache -- cachedir.CacheDirectory for the index. Default: the default
+            cache directory
+        '''
+        self._buffer = None #keeps the index mapped while views are in use
+        self._load_words(path or _DEFAULT_PATH,
+                         cache or cachedir.CacheDirectory())
+
+    def checksum(self):
+        """Return a sha256 digest of the dictionary file contents."""
+        return self._checksum
 
     def __iter__(self):
         for word in self.filter_by():
@@ -18,32 +63,222 @@ class WordList:
 
     def filter_by(self, min_length = 1, max_length = None,
                   plural_uncountables = True):
-        for word in self._words:
-            #filter plural uncountables
-            if  (plural_uncountables == False) and ('%' in word):
+        """Generate words without the % mark, shortest words first and
+        otherwise in dictionary order."""
+        longest = len(self._counts) - 1
+        first = min_length or 0
+        last = min(max_length, longest) if max_length else longest
+        uncountables = self._uncountables
+        for length in range(first, last + 1):
+            count = self._counts[length]
+            if not count: continue
+            start = self._text_starts[length]
+            text = self._text[start:start + count * length].tobytes().decode()
+            if length: words = [text[offset:offset + length]
+                                for offset in range(0, len(text), length)]
+            else: words = [''] * count
+            if plural_uncountables:
+                yield from words
                 continue
-            word = word.replace('%','')
-            
-            #filter by length
-            length = len(word)
-            if min_length and (length < min_length):
-                continue
-            if max_length and (max_length < length):
-                continue
-            #include word if not filtered already
-            yield word
-
-    def _load_words(self):
-        import os
+            for number, word in enumerate(words, self._word_starts[length]):
+                if not uncountables[number >> 3] & (1 << (number & 7)):
+                    yield word
 
+    def _load_words(self, path, cache):
         if '__file__' in globals(): #path to this source file
             this_dir = os.path.abspath(os.path.dirname(__file__))
         else: #relative path when running IDLE, etc.
             this_dir = ''
-        file_path = os.path.join(this_dir, 'dictionaries\\2of12inf.txt')
-##        file_path = os.path.join(this_dir, 'dictionaries\\test.txt')
-        f = open(file_path)
-        return f.read().splitlines()
+        file_path = os.path.join(this_dir, path)
+        checksum = hashlib.sha256()
+        with open(file_path, 'rb') as f: #hash in chunks to skip decoding
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                checksum.update(chunk)
+        self._checksum = checksum.digest()
+
+        def load(index_path): #memory map to skip parsing the dictionary
+            with open(index_path, 'rb') as f:
+                buffer_ = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            self._read_index(buffer_, self._checksum)
+
+        def build(index_path):
+            with open(file_path, 'rb') as f:
+                index = self._build_index(
+                            f.read().decode(errors = 'replace').splitlines(),
+                            self._checksum)
+            if index_path:
+                with open(index_path, 'wb') as f:
+                    f.write(index)
+            self._read_index(index, self._checksum)
+
+        cache.load_or_build(cache.artifact_path('wordlist', self._checksum,
+                                                FORMAT_VERSION),
+                            load, build)
+
+    @staticmethod
+    def _build_index(lines, checksum):
+        """Return the bytes of a word index for lines of a dictionary."""
+        buckets = {} #length: [(word, uncountable), ...]
+        for line in lines:
+            word = WordList._normalized(line.replace(_UNCOUNTABLE_MARK, ''))
+            if word is None: continue
+            uncountable = _UNCOUNTABLE_MARK in line
+            buckets.setdefault(len(word), []).append((word, uncountable))
+        longest = max(buckets, default = 0)
+        ordered = [entry for length in range(longest + 1)
+                   for entry in buckets.get(length, ())]
+        counts = array('i', (len(buckets.get(length, ()))
+                             for length in range(longest + 1)))
+        if sys.byteorder != 'little':
+            counts.byteswap()
+        #fixed width buckets need one byte per letter
+        text = ''.join(word for word, _ in ordered).encode('ascii')
+        uncountables = bytearray(len(ordered) // 8 + 1)
+        for number, (_, uncountable) in enumerate(ordered):
+            if uncountable: uncountables[number >> 3] |= 1 << (number & 7)
+        header = _HEADER.pack(_MAGIC, FORMAT_VERSION, checksum,
+                              len(ordered), longest)
+        return b''.join((header, counts.tobytes(), text, uncountables))
+
+    @staticmethod
+    def _normalized(word):
+        """Return word in lower case without accents (cafe for Café) or None
+        if it has anything else than letters (e.g. don't)."""
+        word = unicodedata.normalize('NFKD', word.strip())
+        word = ''.join(character for character in word
+                       if not unicodedata.combining(character)).lower()
+        return word if _WORD.fullmatch(word) else None
+
+    def _read_index(self, buffer_, checksum):
+        """Use the index in buffer_ in place or raise ValueError if it is
+        not a current index for the dictionary with checksum."""
+        try:
+            magic, version, file_hash, word_count, longest = \
+                _HEADER.unpack_from(buffer_)
+        except struct.error:
+            raise ValueError('truncated word index')
+        if (magic, version, file_hash) != (_MAGIC, FORMAT_VERSION, checksum):
+            raise ValueError('word index is stale or not an index')
+        view = memoryview(buffer_)
+        start = _HEADER.size
+        end = start + 4 * (longest + 1)
+        if len(view) < end:
+            raise ValueError('truncated word index')
+        if sys.byteorder == 'little':
+            counts = view[start:end].cast('i')
+        else: #big endian machines get a swapped copy instead of a view
+            counts = array('i')
+            counts.frombytes(view[start:end])
+            counts.byteswap()
+        sizes = [count * length for length, count in enumerate(counts)]
+        text_end = end + sum(sizes)
+        if (sum(counts) != word_count or
+                len(view) < text_end + word_count // 8 + 1):
+            raise ValueError('truncated word index')
+        self._counts = counts
+        self._word_starts = [0] + list(accumulate(counts))
+        self._text_starts = [0] + list(accumulate(sizes))
+        self._text = view[end:text_end]
+        self._uncountables = view[text_end:text_end + word_count // 8 + 1]
+        self._buffer = buffer_
+
+
+class DictionaryRegistry:
+    '''
+    Named dictionaries, each loaded (and indexed) once when first used.
+    Words can be taken from a combination of dictionaries: the union or
+    intersection of some of them, minus the words of others (deny lists).
+    selection() checks a combination and checksum() identifies it (e.g.
+    for cached results). Searches combine the indexes of each dictionary.
+
+    Public Interface:
+    COMBINATIONS -- ways to combine dictionaries
+    register()
+    names()
+    paths()
+    cache()
+    word_list()
+    selection()
+    checksum()
+    '''
+    COMBINATIONS = ('union', 'intersection')
+
+    def __init__(self, paths = None, cache = None):
+        '''
+        paths -- dict of name: dictionary path (None for the default path).
+            Default: only DEFAULT_DICTIONARY
+        cache -- cachedir.CacheDirectory for the indexes of the dictionaries
+            and of anything compiled from them. Default: the default one
+        '''
+        self._paths = {}
+        self._word_lists = {}
+        self._cache = cache or cachedir.CacheDirectory()
+        for name, path in (paths or {DEFAULT_DICTIONARY: None}).items():
+            self.register(name, path)
+
+    def register(self, name, path = None):
+        '''Add or replace the dictionary called name.'''
+        self._paths[name] = path
+        self._word_lists.pop(name, None)
+
+    def names(self):
+        return list(self._paths)
+
+    def paths(self):
+        '''Return a dict of name: path, e.g. to rebuild this registry.'''
+        return dict(self._paths)
+
+    def cache(self):
+        '''Return the cachedir.CacheDirectory of this registry.'''
+        return self._cache
+
+    def word_list(self, name):
+        '''Return the WordList of the dictionary called name.'''
+        word_list = self._word_lists.get(name)
+        if word_list is None:
+            try: path = self._paths[name]
+            except KeyError:
+                raise ValueError('unknown dictionary: ' + repr(name))
+            word_list = self._word_lists[name] = WordList(path, self._cache)
+        return word_list
+
+    def selection(self, names, combine = 'union', exclude = ()):
+        '''
+        Return (names, combine, exclude) with names and exclude as tuples
+        or raise ValueError if it isn't valid.
+        names -- dictionaries to take words from
+        combine -- 'union' for words in any of them or 'intersection' for
+            words in all of them
+        exclude -- dictionaries whose words are left out
+        '''
+        names, exclude = self._check(names, combine, exclude)
+        return names, combine, exclude
+
+    def checksum(self, names, combine = 'union', exclude = ()):
+        '''
+        Return a sha256 digest that identifies the words of a combination
+        (arguments as in selection()). It changes when any file changes.
+        '''
+        names, exclude = self._check(names, combine, exclude)
+        checksum = hashlib.sha256(combine.encode())
+        for group in (names, exclude): #order within a group doesn't matter
+            for digest in sorted(self.word_list(name).checksum()
+                                 for name in group):
+                checksum.update(digest)
+            checksum.update(b'/')
+        return checksum.digest()
+
+    def _check(self, names, combine, exclude):
+        '''Return names and exclude as tuples. A single name is allowed.'''
+        if isinstance(names, str): names = (names,)
+        if isinstance(exclude, str): exclude = (exclude,)
+        names, exclude = tuple(names), tuple(exclude or ())
+        if not names:
+            raise ValueError('at least one dictionary is needed')
+        if combine not in self.COMBINATIONS:
+            raise ValueError('combine must be one of {}: {!r}'.format(
+                                 self.COMBINATIONS, combine))
+        return names, exclude
                 
 
 
@@ -0,0 +1,364 @@
+from array import array
+import mmap
+import struct
+import sys
+
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+ALPHABET_SIZE = len(ALPHABET)
+# letter to column in a transition row. upper case is accepted for tiles
+_LETTER_INDEX = {letter: index for index, letter in enumerate(ALPHABET)}
+_LETTER_INDEX.update({letter.upper(): index for letter, index in
+                      _LETTER_INDEX.items()})
+_EMPTY_ROW = array('i', [0]) * ALPHABET_SIZE
+# on-disk index: header, little-endian int32 transitions, terminals, heights.
+# bump FORMAT_VERSION whenever the layout changes so old files are rebuilt
+FORMAT_VERSION = 2
+_MAGIC = b'BWTRIE\0\0'
+#magic, version, source hash, min letters, max letters, nodes, words
+_HEADER = struct.Struct('<8sI32sIIII')
+
+
+class WordTrie:
+    """Compact word index with O(1) child transitions.
+
+    Nodes are plain integers. All transitions live in one flat integer array
+    with one 26-wide row per node, so the child of node n for letter index i
+    is transitions[n * 26 + i]. Node 0 is a dead state (every transition
+    leads back to 0) so a falsy node always means "no such prefix".
+    Word ends are kept in a bitset with one bit per node and the longest
+    possible remaining word length is kept in one byte per node.
+
+    With minimize=True the trie is reduced to a DAWG (minimal acyclic word
+    automaton): nodes with identical endings are shared, so suffixes like
+    -s, -ed and -ing are stored once instead of once per stem. Nodes no
+    longer identify a unique prefix, but child/walk/is_word are unchanged.
+
+    Public Interface:
+    ROOT -- node where every word starts
+    from_words()
+    minimized()
+    load()
+    save()
+    child()
+    walk()
+    is_word()
+    height()
+    node_count()
+    __contains__
+    __iter__
+    __len__
+
+    """
+    ROOT = 1
+
+    def __init__(self, transitions, terminals, heights, word_count,
+                 buffer_ = None):
+        """Use from_words() or load() to construct a WordTrie.
+
+        Arguments:
+        transitions -- flat integer sequence of 26-wide rows, one per node
+        terminals -- bitset (bytes-like) marking nodes that complete a word
+        heights -- bytes-like with the most letters that can follow each node
+        word_count -- number of words in the trie
+
+        Keyword Arguments:
+        buffer_ -- memory map that the arrays are views into
+
+        """
+        self._transitions = transitions
+        self._terminals = terminals
+        self._heights = heights
+        self._word_count = word_count
+        self._buffer = buffer_ #keep the map open as long as the views live
+
+    @classmethod
+    def from_words(cls, words, minimize = False):
+        """Construct a WordTrie from any iterable of lower case words.
+
+        Keyword Arguments:
+        minimize -- share identical word endings (see class docstring)
+
+        """
+        transitions = array('i', [0]) * (2 * ALPHABET_SIZE) #dead + root
+        terminals = bytearray(1)
+        heights = bytearray(2)
+        word_count = 0
+        for word in words:
+            node = cls.ROOT
+            remaining = len(word)
+            for letter in word:
+                if heights[node] < remaining: heights[node] = remaining
+                remaining -= 1
+                offset = node * ALPHABET_SIZE + cls._letter_index(letter)
+                child = transitions[offset]
+                if not child: #didn't find letter. create it.
+                    child = len(transitions) // ALPHABET_SIZE
+                    transitions.extend(_EMPTY_ROW)
+                    transitions[offset] = child
+                    heights.append(0)
+                node = child
+            byte, bit = divmod(node, 8)
+            if byte >= len(terminals):
+                terminals.extend(bytes(byte - len(terminals) + 1))
+            if not terminals[byte] & (1 << bit):
+                terminals[byte] |= 1 << bit
+                word_count += 1
+        node_count = len(transitions) // ALPHABET_SIZE
+        terminals.extend(bytes(node_count // 8 + 1 - len(terminals)))
+        trie = cls(transitions, terminals, heights, word_count)
+        if minimize:
+            trie = trie.minimized()
+        return trie
+
+    def minimized(self):
+        """Return an equivalent WordTrie with all equivalent nodes merged.
+
+        Nodes are equivalent when they have the same word end flag and the
+        same (already merged) children, so registering nodes bottom-up in a
+        signature table merges every shared ending in one pass.
+        """
+        transitions = self._transitions
+        new_transitions = array('i', [0]) * (2 * ALPHABET_SIZE) #dead + root
+        new_terminals = bytearray(1)
+        new_heights = bytearray(2)
+        registry = {} #signature: new node
+        merged = array('i', [0]) * self.node_count() #old node: new node
+        stack = [(self.ROOT, False)]
+        while stack: #post-order so children are merged before parents
+            node, children_done = stack.pop()
+            row = node * ALPHABET_SIZE
+            if not children_done:
+                stack.append((node, True))
+                for index in range(ALPHABET_SIZE):
+                    child = transitions[row + index]
+                    if child: stack.append((child, False))
+                continue
+            new_row = array('i', [merged[child] for child in
+                                  transitions[row:row + ALPHABET_SIZE]])
+            signature = (self.is_word(node), new_row.tobytes())
+            if node == self.ROOT: #root has the only full-length language
+                new_node = self.ROOT
+                new_transitions[new_node * ALPHABET_SIZE:
+                                (new_node + 1) * ALPHABET_SIZE] = new_row
+                new_heights[new_node] = self._heights[node]
+            else:
+                new_node = registry.get(signature)
+                if new_node is None:
+                    new_node = len(new_transitions) // ALPHABET_SIZE
+                    new_transitions.extend(new_row)
+                    new_heights.append(self._heights[node])
+                    registry[signature] = new_node
+            merged[node] = new_node
+            if signature[0]:
+                byte, bit = divmod(new_node, 8)
+                if byte >= len(new_terminals):
+                    new_terminals.extend(bytes(byte - len(new_terminals) + 1))
+                new_terminals[byte] |= 1 << bit
+        node_count = len(new_transitions) // ALPHABET_SIZE
+        new_terminals.extend(bytes(node_count // 8 + 1 - len(new_terminals)))
+        return self.__class__(new_transitions, new_terminals, new_heights,
+                              self._word_count)
+
+    @classmethod
+    def load(cls, path, source_hash, min_letters = 1, max_letters = None):
+        """Open an index file written by save() without copying it.
+
+        The file is memory mapped and the node arrays are used in place, so
+        opening costs the same regardless of dictionary size.
+
+        Arguments:
+        path -- path of the index file
+        source_hash -- 32 byte digest of the dictionary the index must match
+
+        Keyword Arguments:
+        min_letters, max_letters -- length filters the index must match
+
+        Raises ValueError if the file is not a current index for the given
+        dictionary and filters.
+
+        """
+        with open(path, 'rb') as f:
+            buffer_ = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        try:
+            magic, version, file_hash, file_min, file_max, node_count, \
+                word_count = _HEADER.unpack_from(buffer_)
+        except struct.error:
+            buffer_.close()
+            raise ValueError('truncated index file: ' + path)
+        expected = (_MAGIC, FORMAT_VERSION, source_hash,
+                    min_letters or 0, max_letters or 0)
+        if (magic, version, file_hash, file_min, file_max) != expected:
+            buffer_.close()
+            raise ValueError('index file is stale or not an index: ' + path)
+        start = _HEADER.size
+        end = start + 4 * ALPHABET_SIZE * node_count
+        terminals_end = end + node_count // 8 + 1
+        heights_end = terminals_end + node_count
+        if len(buffer_) < heights_end:
+            buffer_.close()
+            raise ValueError('truncated index file: ' + path)
+        view = memoryview(buffer_)
+        if sys.byteorder == 'little':
+            transitions = view[start:end].cast('i')
+        else: #big endian machines get a swapped copy instead of a view
+            transitions = array('i')
+            transitions.frombytes(view[start:end])
+            transitions.byteswap()
+        terminals = view[end:terminals_end]
+        heights = view[terminals_end:heights_end]
+        return cls(transitions, terminals, heights, word_count,
+                   buffer_ = buffer_)
+
+    def save(self, path, source_hash, min_letters = 1, max_letters = None):
+        """Write the index to path in the format read by load().
+
+        Arguments and keyword arguments are as in load(). They are recorded
+        in the header so stale files can be detected.
+
+        """
+        transitions = array('i', self._transitions)
+        if sys.byteorder != 'little':
+            transitions.byteswap()
+        header = _HEADER.pack(_MAGIC, FORMAT_VERSION, source_hash,
+                              min_letters or 0, max_letters or 0,
+                              self.node_count(), self._word_count)
+        with open(path, 'wb') as f:
+            f.write(header)
+            transitions.tofile(f)
+            f.write(self._terminals)
+            f.write(self._heights)
+
+    @staticmethod
+    def _letter_index(letter):
+        try:
+            return _LETTER_INDEX[letter]
+        except KeyError:
+            raise ValueError('letter outside of the alphabet: ' + repr(letter))
+
+    def child(self, node, letter):
+        """Return the node reached from node by letter or 0 if none."""
+        index = _LETTER_INDEX.get(letter)
+        if index is None: return 0
+        return self._transitions[node * ALPHABET_SIZE + index]
+
+    def walk(self, node, letters):
+        """Return the node reached from node by spelling letters or 0 if none.
+        An empty string of letters stays on node."""
+        transitions = self._transitions
+        for letter in letters:
+            index = _LETTER_INDEX.get(letter)
+            if index is None: return 0
+            node = transitions[node * ALPHABET_SIZE + index]
+            if not node: return 0
+        return node
+
+    def is_word(self, node):
+        """Return True if the route to node spells a complete word."""
+        return bool(self._terminals[node >> 3] & (1 << (node & 7)))
+
+    def height(self, node):
+        """Return the most letters that can follow node to complete a word."""
+        return self._heights[node]
+
+    def node_count(self):
+        """Return the number of nodes including the dead node."""
+        return len(self._transitions) // ALPHABET_SIZE
+
+    def __contains__(self, word):
+        return self.is_word(self.walk(self.ROOT, word))
+
+    def __iter__(self):
+        """Generate all words in alphabetical order."""
+        transitions = self._transitions
+        stack = [(self.ROOT, '')]
+        while stack:
+            node, word = stack.pop()
+            if self.is_word(node): yield word
+            row = node * ALPHABET_SIZE
+            #use reversed to pop children in alphabetical order
+            for index in reversed(range(ALPHABET_SIZE)):
+                child = transitions[row + index]
+                if child: stack.append((child, word + ALPHABET[index]))
+
+    def __len__(self):
+        return self._word_count
+
+
+class CombinedTrie:
+    """Words of several WordTries combined at query time, with no new index.
+
+    A node is a tuple of one node of each trie, so walking it walks all of
+    them at once. The route spells a word if it is a word in any (union)
+    or all (intersection) of the tries and in none of the excluded tries.
+    As in WordTrie, a falsy node (0) means "no such prefix".
+
+    Public Interface:
+    ROOT -- node where every word starts
+    child()
+    walk()
+    is_word()
+    height()
+    __contains__
+
+    """
+    def __init__(self, tries, combine = 'union', excluded = ()):
+        """Combine tries.
+
+        Arguments:
+        tries -- WordTries (or anything with the same node methods)
+
+        Keyword Arguments:
+        combine -- 'union' or 'intersection' of the words of tries
+        excluded -- tries whose words are left out
+
+        """
+        self._tries = list(tries) + list(excluded)
+        self._count = len(tries) #included tries come first
+        self._intersection = combine == 'intersection'
+        self.ROOT = tuple(trie.ROOT for trie in self._tries)
+
+    def child(self, node, letter):
+        """Return the node reached from node by letter or 0 if none."""
+        return self.walk(node, letter)
+
+    def walk(self, node, letters):
+        """Return the node reached from node by spelling letters or 0 if none.
+        An empty string of letters stays on node."""
+        if not node: return 0
+        node = tuple(trie.walk(part, letters) if part else 0
+                     for trie, part in zip(self._tries, node))
+        included = node[:self._count]
+        if not (all(included) if self._intersection else any(included)):
+            return 0
+        return node
+
+    def is_word(self, node):
+        """Return True if the route to node spells a complete word."""
+        if not node: return False
+        words = [bool(part) and trie.is_word(part)
+                 for trie, part in zip(self._tries, node)]
+        included = words[:self._count]
+        if not (all(included) if self._intersection else any(included)):
+            return False
+        return not any(words[self._count:])
+
+    def height(self, node):
+        """Return the most letters that can follow node to complete a word."""
+        if not node: return 0
+        heights = [trie.height(part) for trie, part in
+                   zip(self._tries[:self._count], node) if part]
+        return min(heights) if self._intersection else max(heights)
+
+    def __contains__(self, word):
+        return self.is_word(self.walk(self.ROOT, word))
+
+
+def main():
+    words = ['a', 'at', 'ate', 'tea', 'teas', 'tease', 'ates']
+    for minimize in (False, True):
+        trie = WordTrie.from_words(words, minimize = minimize)
+        print(len(trie), 'words in', trie.node_count(), 'nodes')
+        print(list(trie))
+
+if __name__ == '__main__':
+    main()